@@ -6,58 +6,100 @@ from models import ResponseSignal
 from .ProjectController import ProjectController
 import re
 import os
+import asyncio
+import hashlib
+
+# 64 KiB reads/writes keep the syscall count low without holding much of the upload in memory
+# (the FILE_CHUNK_SIZE setting defaults to the same value)
+UPLOAD_BUFFER_SIZE = 1 << 16
+
+# anything that is not a word character or a dot
+_CLEAN_RE = re.compile(r'[^\w.]')
+
+# ProjectController holds no per-request state, so one instance serves every upload
+_project_ctrl = ProjectController()
 
 class DataController(BaseController):
     def __init__(self):
         super().__init__()
     
-    async def validate_uploaded_file(self, file: UploadFile):
+    async def validate_and_save(self, file: UploadFile, dest_path: str, max_size: int,
+                                chunk_size: int = UPLOAD_BUFFER_SIZE):
         """
-        Validate uploaded file (type and size).
-        Reads file content to check size, returns content for reuse.
+        Reject the upload if its declared content type is not allowed, then
+        copy it to disk in chunk_size blocks (one worker-thread call),
+        stopping as soon as it exceeds max_size. The upload is never held in
+        memory as a whole; a partial file is removed if the copy fails or
+        the size limit is hit.
+        
+        The content is hashed with BLAKE2b as it streams past.
         
         Returns:
-            tuple: (is_valid: bool, result_signal: str, file_content: bytes or None)
+            tuple: (is_valid: bool, result_signal: str, content_hash: str or None)
+        
+        Raises:
+            FileExistsError: If dest_path already exists
         """
         # Check file type
         if file.content_type not in self.app_settings.FILE_ALLOWED_EXTENSIONS:
             return False, ResponseSignal.file_type_not_supported.value, None
         
-        # Read file content to check size
         try:
-            file_content = await file.read()
-            file_size = len(file_content)
-            
-            # Check file size
-            if file_size > self.app_settings.FILE_MAX_SIZE:
-                return False, ResponseSignal.file_size_exceeded.value, None
-            
-            # File is valid, return content for saving
-            return True, ResponseSignal.success_file_upload.value, file_content
-            
+            total_size, content_hash = await asyncio.get_running_loop().run_in_executor(
+                None, self._copy_upload, file.file, dest_path, max_size, chunk_size
+            )
+        except FileExistsError:
+            # The path belongs to another upload; let the caller pick a new name
+            raise
         except Exception as e:
-            # If reading fails, reject the file
+            # If reading or writing fails, reject the file
+            self._remove_partial_file(dest_path)
             return False, ResponseSignal.failed_file_upload.value, None
+        
+        if total_size > max_size:
+            self._remove_partial_file(dest_path)
+            return False, ResponseSignal.file_size_exceeded.value, None
+        
+        return True, ResponseSignal.success_file_upload.value, content_hash
+    
+    def _copy_upload(self, source, dest_path: str, max_size: int, chunk_size: int):
+        """
+        Copy source to dest_path block by block, stopping once max_size is exceeded.
+        Returns (bytes read, hex BLAKE2b digest of the copied bytes); the byte
+        count is > max_size if the copy was cut short.
+        """
+        total_size = 0
+        hasher = hashlib.blake2b()
+        # "x" creates the file exclusively; a name collision raises FileExistsError
+        with open(dest_path, "xb", buffering=chunk_size) as f:
+            while chunk := source.read(chunk_size):
+                total_size += len(chunk)
+                
+                # Check file size
+                if total_size > max_size:
+                    break
+                
+                f.write(chunk)
+                hasher.update(chunk)
+        return total_size, hasher.hexdigest()
+    
+    def _remove_partial_file(self, file_path: str):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
     
     def generate_unique_file_path(self, orig_file_name: str, project_id: str):
         random_filename = self.generate_random_string()
-        project_path = ProjectController().get_project_path(project_id=project_id)
+        project_path = _project_ctrl.get_project_path(project_id=project_id)
         clean_file_name = self.get_clean_file_name(orig_file_name=orig_file_name)
         new_file_path = os.path.join(project_path, random_filename + "_" + clean_file_name)
 
-        while os.path.exists(new_file_path):
-            random_filename = self.generate_random_string()
-            new_file_path = os.path.join(project_path, random_filename + "_" + clean_file_name)
-
+        # Uniqueness is enforced when validate_and_save creates the file exclusively
         return new_file_path , random_filename + "_" + clean_file_name
 
 
     def get_clean_file_name(self, orig_file_name: str):
 
-        # remove any special characters, except underscore and .
-        cleaned_file_name = re.sub(r'[^\w.]', '', orig_file_name.strip())
-
-        # replace spaces with underscore
-        cleaned_file_name = cleaned_file_name.replace(" ", "_")
-        
-        return cleaned_file_name
+        # remove any special characters (spaces included), except underscore and .
+        return _CLEAN_RE.sub('', orig_file_name.strip())
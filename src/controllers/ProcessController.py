@@ -1,13 +1,116 @@
 from .BaseController import BaseController
 from .ProjectController import ProjectController
 import os
+import re
+import asyncio
+import fitz
+from pathlib import Path
 from langchain_community.document_loaders import TextLoader
 from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_community.document_loaders import UnstructuredWordDocumentLoader
-from langchain_community.document_loaders import UnstructuredMarkdownLoader
+from langchain_community.document_loaders import Docx2txtLoader
 from langchain_community.document_loaders import CSVLoader
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from models import ProcessingEnum
+import logging
+
+logger = logging.getLogger("uvicorn.error")
+
+# Chunks whose first line is one of these section headings are never useful retrieval context
+# (the heading must stand alone, so body text such as "References to..." is kept)
+_BOILERPLATE_RE = re.compile(
+    r'\s*(references?|acknowledg(e)?ments?|bibliography|appendix(\s+[a-z0-9]{1,3})?)\s*:?\s*',
+    re.IGNORECASE
+)
+
+# Pages handed to each worker when splitting in a process pool
+SPLIT_PAGES_PER_TASK = 20
+
+# Pages each worker extracts when a PDF is read in parallel
+EXTRACT_PAGES_PER_TASK = 25
+
+
+def pdf_page_count(file_path: str) -> int:
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int):
+    """
+    Extract (text, metadata) pairs for pages [start, end) of a PDF.
+    Module-level so it can be pickled and run in a worker process.
+    """
+    with fitz.open(file_path) as doc:
+        total_pages = doc.page_count
+        return [
+            (doc[page_number].get_text("text"), {
+                "source": file_path,
+                "page": page_number,
+                "total_pages": total_pages,
+            })
+            for page_number in range(start, min(end, total_pages))
+        ]
+
+
+def split_pages(pages, chunk_size: int, overlap_size: int):
+    """
+    Split (text, metadata) pages into LangChain Documents.
+    Module-level so it can be pickled and run in a worker process.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap_size,
+        length_function=len,
+    )
+
+    chunks = []
+    for text, metadata in pages:
+        chunks.extend(
+            text_splitter.create_documents([text], metadatas=[metadata])
+        )
+    return chunks
+
+
+class MarkdownTextLoader:
+    """
+    Minimal Markdown loader that reads the file as plain text.
+    Avoids the unstructured partition pipeline (and its NLTK downloads);
+    the text splitter handles the rest.
+    """
+
+    def __init__(self, file_path: str, encoding: str = "utf-8"):
+        self.file_path = file_path
+        self.encoding = encoding
+
+    def load(self):
+        text = Path(self.file_path).read_text(encoding=self.encoding)
+        return [Document(page_content=text, metadata={"source": self.file_path})]
+
+
+# file extension -> loader constructor taking the file path
+_LOADER_FACTORIES = {
+    ProcessingEnum.TXT.value: lambda path: TextLoader(path, encoding="utf-8"),
+    ProcessingEnum.PDF.value: PyMuPDFLoader,
+    ProcessingEnum.DOCX.value: Docx2txtLoader,
+    ProcessingEnum.MD.value: MarkdownTextLoader,
+    ProcessingEnum.CSV.value: CSVLoader,
+    ProcessingEnum.RTF.value: lambda path: TextLoader(path, encoding="utf-8"),
+}
+
+
+def load_file_pages(file_path: str, file_ext: str):
+    """
+    Load a non-PDF file through its LangChain loader as (text, metadata) pairs.
+    Module-level so it can be pickled and run in a worker process.
+    """
+    factory = _LOADER_FACTORIES.get(file_ext)
+    if factory is None:
+        supported_types = [e.value for e in ProcessingEnum]
+        raise ValueError(
+            f"Unsupported file type: {file_ext}. Supported types: {supported_types}"
+        )
+    return [(rec.page_content, rec.metadata) for rec in factory(file_path).load()]
+
 
 class ProcessController(BaseController):
 
@@ -22,99 +125,178 @@ class ProcessController(BaseController):
 
     def get_file_loader(self, file_id: str):
 
+        factory = _LOADER_FACTORIES.get(self.get_file_extension(file_id=file_id))
+        if factory is None:
+            return None
+
+        return factory(os.path.join(self.project_path, file_id))
+
+    def iter_file_content(self, file_id: str):
+        """
+        Yield (text, metadata) pairs for the file, one per page/document.
+        PDFs are read page-by-page with PyMuPDF so no Document list is
+        materialized; other types go through their LangChain loader.
+        """
+        file_path = os.path.join(self.project_path, file_id)
         file_ext = self.get_file_extension(file_id=file_id)
-        file_path = os.path.join(
-            self.project_path,
-            file_id
-        )
 
-        if file_ext == ProcessingEnum.TXT.value:
-            return TextLoader(file_path, encoding="utf-8")
+        if file_ext == ProcessingEnum.PDF.value:
+            with fitz.open(file_path) as doc:
+                total_pages = doc.page_count
+                for page_number, page in enumerate(doc):
+                    yield page.get_text("text"), {
+                        "source": file_path,
+                        "page": page_number,
+                        "total_pages": total_pages,
+                    }
+            return
 
-        elif file_ext == ProcessingEnum.PDF.value:
-            return PyMuPDFLoader(file_path)
-        
-        elif file_ext == ProcessingEnum.DOCX.value:
-            return UnstructuredWordDocumentLoader(file_path)
-        
-        elif file_ext == ProcessingEnum.MD.value:
-            return UnstructuredMarkdownLoader(file_path)
-        
-        elif file_ext == ProcessingEnum.CSV.value:
-            return CSVLoader(file_path)
-        
-        elif file_ext == ProcessingEnum.RTF.value:
-            return TextLoader(file_path, encoding="utf-8")
-        
-        return None
+        yield from load_file_pages(file_path, file_ext)
 
     def get_file_content(self, file_id: str):
-        import logging
-        logger = logging.getLogger("uvicorn.error")
-        
         file_ext = self.get_file_extension(file_id=file_id)
         file_path = os.path.join(self.project_path, file_id)
         
-        logger.info(f"Getting file content for: {file_id}")
-        logger.info(f"File extension detected: {file_ext}")
-        logger.info(f"Full file path: {file_path}")
-        logger.info(f"File exists: {os.path.exists(file_path)}")
+        logger.debug("Getting file content for: %s (extension: %s)", file_path, file_ext)
         
-        loader = self.get_file_loader(file_id=file_id)
-        if loader is None:
+        if file_ext not in _LOADER_FACTORIES:
             supported_types = [e.value for e in ProcessingEnum]
             error_msg = f"Unsupported file type: {file_ext}. Supported types: {supported_types}"
             logger.error(error_msg)
             raise ValueError(error_msg)
         
-        logger.info(f"Loader created: {type(loader).__name__}")
-        
         try:
-            logger.info(f"Attempting to load file: {file_path}")
-            documents = loader.load()
-            logger.info(f"File loaded successfully: {len(documents)} documents/pages extracted")
+            pages = list(self.iter_file_content(file_id=file_id))
             
-            # Log first document info for debugging
-            if documents and len(documents) > 0:
-                first_doc = documents[0]
-                logger.info(f"First document metadata: {first_doc.metadata}")
-                logger.info(f"First document content length: {len(first_doc.page_content)} characters")
+            # Log first page info for debugging
+            if pages and logger.isEnabledFor(logging.DEBUG):
+                first_text, first_metadata = pages[0]
+                logger.debug("File loaded: %d documents/pages extracted", len(pages))
+                logger.debug("First document metadata: %s", first_metadata)
+                logger.debug("First document content length: %d characters", len(first_text))
             
-            return documents
+            return pages
         except FileNotFoundError as e:
             error_msg = f"File not found: {file_path}"
             logger.error(error_msg)
             raise FileNotFoundError(error_msg)
         except Exception as e:
             error_msg = f"Error loading file {file_id}: {str(e)}"
-            logger.error(f"{error_msg} (Exception type: {type(e).__name__})", exc_info=True)
+            logger.error("%s (Exception type: %s)", error_msg, type(e).__name__, exc_info=True)
             raise RuntimeError(error_msg) from e
 
-    def process_file_content(self, file_content: list, file_id: str,
-                            chunk_size: int=1000, overlap_size: int=200):
+    async def aget_file_content(self, file_id: str, executor):
+        """
+        Async counterpart of get_file_content that runs on the given executor.
+        PDFs are cut into page ranges extracted by several workers at once;
+        other file types are loaded by a single worker.
+        """
+        loop = asyncio.get_running_loop()
+        file_ext = self.get_file_extension(file_id=file_id)
+        file_path = os.path.join(self.project_path, file_id)
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=overlap_size,
-            length_function=len,
-        )
+        if file_ext not in _LOADER_FACTORIES:
+            supported_types = [e.value for e in ProcessingEnum]
+            error_msg = f"Unsupported file type: {file_ext}. Supported types: {supported_types}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
 
-        file_content_texts = [
-            rec.page_content
-            for rec in file_content
-        ]
+        try:
+            if file_ext != ProcessingEnum.PDF.value:
+                # Submit a module-level function with plain arguments, not a bound method:
+                # the controller itself never has to be pickled for the worker
+                return await loop.run_in_executor(executor, load_file_pages, file_path, file_ext)
 
-        file_content_metadata = [
-            rec.metadata
-            for rec in file_content
+            page_count = await loop.run_in_executor(executor, pdf_page_count, file_path)
+            ranges = await asyncio.gather(*(
+                loop.run_in_executor(executor, extract_pdf_pages, file_path, start, start + EXTRACT_PAGES_PER_TASK)
+                for start in range(0, page_count, EXTRACT_PAGES_PER_TASK)
+            ))
+        except FileNotFoundError as e:
+            error_msg = f"File not found: {file_path}"
+            logger.error(error_msg)
+            raise FileNotFoundError(error_msg)
+        except Exception as e:
+            error_msg = f"Error loading file {file_id}: {str(e)}"
+            logger.error("%s (Exception type: %s)", error_msg, type(e).__name__, exc_info=True)
+            raise RuntimeError(error_msg) from e
+
+        return [page for pages in ranges for page in pages]
+
+    def process_file_content(self, file_content, file_id: str,
+                            chunk_size: int=1000, overlap_size: int=200,
+                            min_chunk_size: int=100):
+        """
+        Split an iterable of (text, metadata) pages into chunks.
+        Pages are split one at a time, so no intermediate text/metadata
+        lists are built for the whole file. Fragments shorter than
+        min_chunk_size are then merged into a neighbouring chunk, and
+        boilerplate sections (references, appendix, ...) are dropped.
+        """
+
+        chunks = split_pages(file_content, chunk_size=chunk_size, overlap_size=overlap_size)
+
+        return self.drop_boilerplate_chunks(self.merge_small_chunks(
+            chunks,
+            min_size=min_chunk_size,
+            max_size=chunk_size + overlap_size
+        ))
+
+    async def process_file_content_in_pool(self, file_content: list, file_id: str, executor,
+                                           chunk_size: int=1000, overlap_size: int=200,
+                                           min_chunk_size: int=100):
+        """
+        Same as process_file_content, but splits groups of pages in
+        parallel on the given executor. Group results are concatenated
+        in page order before small chunks are merged.
+        """
+        loop = asyncio.get_running_loop()
+        groups = [
+            file_content[i:i + SPLIT_PAGES_PER_TASK]
+            for i in range(0, len(file_content), SPLIT_PAGES_PER_TASK)
         ]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, split_pages, group, chunk_size, overlap_size)
+            for group in groups
+        ))
 
-        chunks = text_splitter.create_documents(
-            file_content_texts,
-            metadatas=file_content_metadata
-        )
+        chunks = [chunk for group_chunks in results for chunk in group_chunks]
+
+        return self.drop_boilerplate_chunks(self.merge_small_chunks(
+            chunks,
+            min_size=min_chunk_size,
+            max_size=chunk_size + overlap_size
+        ))
 
-        return chunks
+    def merge_small_chunks(self, chunks, min_size: int, max_size: int):
+        """
+        Merge chunks shorter than min_size with the preceding chunk from the
+        same source and page, as long as the result stays within max_size.
+        The merged chunk keeps the metadata of the earlier one, which is only
+        correct because both halves come from the same page.
+        """
+        merged = []
+        for chunk in chunks:
+            if merged:
+                prev = merged[-1]
+                if (
+                    (len(chunk.page_content) < min_size or len(prev.page_content) < min_size)
+                    and prev.metadata.get("source") == chunk.metadata.get("source")
+                    and prev.metadata.get("page") == chunk.metadata.get("page")
+                    and len(prev.page_content) + len(chunk.page_content) + 1 <= max_size
+                ):
+                    prev.page_content = f"{prev.page_content}\n{chunk.page_content}"
+                    continue
+            merged.append(chunk)
 
+        return merged
 
-    
\ No newline at end of file
+    def drop_boilerplate_chunks(self, chunks):
+        """Remove chunks whose first line is a references/acknowledgements/bibliography/appendix heading."""
+        kept = [
+            chunk for chunk in chunks
+            if not _BOILERPLATE_RE.fullmatch(chunk.page_content.lstrip().split("\n", 1)[0])
+        ]
+        if len(kept) < len(chunks):
+            logger.info("Dropped %d boilerplate chunks", len(chunks) - len(kept))
+        return kept
@@ -2,15 +2,21 @@ from .BaseController import BaseController
 import os
 class ProjectController(BaseController):
 
+    # project_id -> directory already created on disk
+    _project_paths = {}
+
     def __init__(self):
         super().__init__()
     
     def get_project_path(self , project_id: str):
-        project_dir = os.path.join(self.file_dir , project_id)
+        project_dir = ProjectController._project_paths.get(project_id)
+        if project_dir is not None:
+            return project_dir
 
-        if not os.path.exists(project_dir):
-            os.makedirs(project_dir)
+        project_dir = os.path.join(self.file_dir , project_id)
+        os.makedirs(project_dir, exist_ok=True)
 
+        ProjectController._project_paths[project_id] = project_dir
         return project_dir
     
     
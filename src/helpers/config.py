@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings ,SettingsConfigDict
+from functools import lru_cache
 import os 
 
 
@@ -6,26 +7,62 @@ class Settings(BaseSettings):
     APPLICATION_NAME : str
     APP_VERSION : str
     OPENAI_API_KEY : str = ""  # Optional - can be empty for search-only mode
-    FILE_ALLOWED_EXTENSIONS :list 
+    FILE_ALLOWED_EXTENSIONS :frozenset[str]  # parsed from a JSON list; set for O(1) membership checks
     FILE_MAX_SIZE :int   # 10 MB
-    FILE_CHUNK_SIZE : int # 512000 #kb = half megabyte
+    FILE_CHUNK_SIZE : int = 65536  # bytes per read/write block when saving an upload
     MONGODB_URl : str
     MONGODB_DB_NAME : str
     EMBEDDING_MODEL : str = "all-MiniLM-L6-v2"
     EMBEDDING_DIMENSION : int = 384
     EMBEDDING_BATCH_SIZE : int = 32
     EMBEDDING_DEVICE : str = "cpu"
+    EMBEDDING_BACKEND : str = "torch"  # torch | onnx | openvino | ipex
+    EMBEDDING_QUANT : str = "none"  # none | fp16 (cuda) | int8 (cpu)
+    EMBEDDING_COMPILE : bool = False  # torch.compile the model (cuda only)
+    EMBEDDING_QUEUE_MAX_BATCH : int = 64  # queries fused into one encode call
+    EMBEDDING_QUEUE_MAX_WAIT_MS : float = 5.0  # how long the batcher waits to fill a batch
+    EMBEDDING_CACHE_DIR : str = "src/assets/embedding_cache"  # persistent query embeddings; empty disables
+    EMBEDDING_CACHE_TTL : int = 86400  # seconds; 0 keeps entries forever
     CHROMADB_PATH : str = "src/assets/chromadb"
     CHROMADB_COLLECTION_PREFIX : str = "project_"
+    CHROMADB_ADD_BATCH_SIZE : int = 166  # rows per collection.add call
+    HNSW_M : int = 24  # graph degree of new collections
+    HNSW_EF_CONSTRUCTION : int = 128
+    HNSW_EF_SEARCH : int = 100
+    # f32 | f16 | i8 | binary: extra compact copy stored next to Chroma's float32 vectors for the
+    # two-stage searches (adds storage; it speeds up scans, it does not shrink the index)
+    EMBEDDING_STORAGE_DTYPE : str = "f32"
     VECTOR_SEARCH_TOP_K : int = 5
+    VECTOR_QUERY_CACHE_SIZE : int = 1024  # cached search results across projects
+    VECTOR_QUERY_CACHE_TTL : int = 300  # seconds
+    VECTORDB_IO_THREADS : int = 8  # workers for bulk collection lookups
+    VECTOR_STATS_CACHE_TTL : int = 60  # seconds before collection stats are rescanned
+    VECTOR_SHADOW_INDEX_CACHE_SIZE : int = 16  # projects whose decoded compact rows stay in memory
+    VECTOR_SHADOW_INDEX_TTL : int = 60  # seconds before decoded compact rows are reloaded
     LLM_MODEL : str = "gpt-3.5-turbo"
     LLM_TEMPERATURE : float = 0.7
     LLM_MAX_TOKENS : int = 500
+    LLM_CONTEXT_WINDOW : int = 16385  # prompt + response token limit of LLM_MODEL
+    LLM_MAX_CONCURRENCY : int = 8  # in-flight OpenAI requests per process
+    LLM_MAX_CONNECTIONS : int = 200  # shared HTTP pool size for OpenAI
+    LLM_MAX_KEEPALIVE : int = 100  # idle connections kept open for reuse
     RAG_CONTEXT_CHUNKS : int = 5
     RAG_SIMILARITY_THRESHOLD : float = 0.0  # Disabled by default - use all results
+    RAG_ANSWER_CACHE_ENABLED : bool = True
+    RAG_ANSWER_CACHE_SIMILARITY : float = 0.97  # cosine similarity for a cached answer to be reused
+    RAG_ANSWER_CACHE_TTL : int = 3600  # seconds
+    RAG_ANSWER_CACHE_MAX_ENTRIES : int = 500  # per project, least recently used evicted first
+    RAG_PROMPT_CACHE_SIZE : int = 1024  # built prompts kept for identical repeat requests
+    RAG_PROMPT_CACHE_TTL : int = 600  # seconds
+    RAG_STABLE_CONTEXT_ORDER : bool = False  # order context by document position so provider prompt caching hits
     
-    class Config :
-        env_file = os.path.join(os.path.dirname(__file__), "../assets/.env")
+    # Frozen: the cached instance is shared process-wide and must not be mutated
+    model_config = SettingsConfigDict(
+        env_file=os.path.join(os.path.dirname(__file__), "../assets/.env"),
+        frozen=True
+    )
 
+@lru_cache(maxsize=1)
 def get_settings():
+    # Parse the env file once; every later call returns the same instance
     return Settings()
\ No newline at end of file
@@ -1,8 +1,16 @@
 from routes import base_router , data_router
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel
 from helpers import get_settings
-app = FastAPI()
+from models.enums import DataBaseEnum
+from services import EmbeddingService, VectorDBService, LLMService, RAGService
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+# orjson serializes response bodies several times faster than the stdlib json encoder
+app = FastAPI(default_response_class=ORJSONResponse)
 
 @app.on_event("startup")
 async def start_db_client():
@@ -10,6 +18,44 @@ async def start_db_client():
     app.mongo_connection = AsyncIOMotorClient(settings.MONGODB_URl)
     app.db_client = app.mongo_connection[settings.MONGODB_DB_NAME]
 
+    # Back the chunk lookups (by file, by project ordered by chunk_order) and project lookups
+    await app.db_client[DataBaseEnum.COLLECTION_CHUNK_NAME.value].create_indexes([
+        IndexModel([("chunk_project_id", ASCENDING), ("file_id", ASCENDING), ("chunk_order", ASCENDING)]),
+        IndexModel([("chunk_project_id", ASCENDING), ("chunk_order", ASCENDING)])
+    ])
+    await app.db_client[DataBaseEnum.COLLECTION_PROJECT_NAME.value].create_index(
+        [("project_id", ASCENDING)]
+    )
+    # One record per distinct file content within a project (upload deduplication)
+    await app.db_client[DataBaseEnum.COLLECTION_FILE_NAME.value].create_index(
+        [("file_project_id", ASCENDING), ("content_hash", ASCENDING)],
+        unique=True
+    )
+
+@app.on_event("startup")
+async def start_pdf_pool():
+    # File parsing is CPU-bound; run it in worker processes so the event loop stays free
+    # Workers come from a forkserver (spawn where unavailable), not a fork of this process:
+    # forking after torch threads, Chroma's SQLite handles and the event loop exist can deadlock
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    app.pdf_pool = ProcessPoolExecutor(
+        max_workers=min(os.cpu_count() or 1, 4),
+        mp_context=multiprocessing.get_context(start_method)
+    )
+
+@app.on_event("startup")
+async def start_services():
+    # Build the services once so requests reuse a loaded, warmed-up model and open clients
+    app.embedding_service = EmbeddingService()
+    app.embedding_service.warmup()
+    app.embedding_service.start_batcher()
+    app.vector_db_service = VectorDBService()
+    app.rag_service = RAGService(
+        embedding_service=app.embedding_service,
+        vector_db_service=app.vector_db_service
+    )
+    await app.rag_service.warmup()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     try:
@@ -20,5 +66,21 @@ async def shutdown_db_client():
     except Exception as e:
         pass  # Ignore shutdown errors
 
+@app.on_event("shutdown")
+async def shutdown_embedding_batcher():
+    embedding_service = getattr(app, 'embedding_service', None)
+    if embedding_service is not None:
+        await embedding_service.stop_batcher()
+
+@app.on_event("shutdown")
+async def shutdown_llm_client():
+    await LLMService.aclose()
+
+@app.on_event("shutdown")
+async def shutdown_pdf_pool():
+    pdf_pool = getattr(app, 'pdf_pool', None)
+    if pdf_pool is not None:
+        pdf_pool.shutdown(wait=False, cancel_futures=True)
+
 app.include_router(base_router)
 app.include_router(data_router)
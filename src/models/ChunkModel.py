@@ -3,6 +3,10 @@ from .db_schemas import DataChunk
 from .enums import DataBaseEnum
 from bson.objectid import ObjectId
 from typing import List, Optional
+import numpy as np
+
+# Documents fetched per round-trip when iterating chunk cursors
+CURSOR_BATCH_SIZE = 500
 
 class ChunkModel(BaseDataModel):
 
@@ -10,7 +14,7 @@ class ChunkModel(BaseDataModel):
         super().__init__(db_client)
         self.collection = self.db_client[DataBaseEnum.COLLECTION_CHUNK_NAME.value]
     
-    async def save_chunks(self, chunks: list, project_id: ObjectId, file_id: str, embeddings: Optional[List[List[float]]] = None) -> int:
+    async def save_chunks(self, chunks: list, project_id: ObjectId, file_id: str, embeddings: Optional[np.ndarray] = None) -> int:
         """
         Save multiple chunks to MongoDB with optional embeddings.
         
@@ -18,7 +22,7 @@ class ChunkModel(BaseDataModel):
             chunks: List of LangChain Document objects
             project_id: ObjectId of the project
             file_id: String identifier of the source file
-            embeddings: Optional list of embedding vectors (one per chunk)
+            embeddings: Optional array of embedding vectors (one row per chunk)
             
         Returns:
             int: Number of chunks saved
@@ -26,64 +30,75 @@ class ChunkModel(BaseDataModel):
         if not chunks or len(chunks) == 0:
             return 0
         
-        chunk_documents = []
-        for idx, chunk in enumerate(chunks, start=1):
-            chunk_doc = DataChunk(
-                chunk_text=chunk.page_content,
-                chunk_order=idx,
-                chunk_project_id=project_id,
-                file_id=file_id,
-                metadata=chunk.metadata if hasattr(chunk, 'metadata') else None,
-                embedding=embeddings[idx - 1] if embeddings and idx <= len(embeddings) else None
-            )
-            chunk_dict = chunk_doc.model_dump()
-            chunk_documents.append(chunk_dict)
+        # Build the documents directly; DataChunk validation is kept for the read side
+        vectors = np.asarray(embeddings, dtype=np.float32) if embeddings is not None else None
+        embedding_count = len(vectors) if vectors is not None else 0
+        chunk_documents = [
+            {
+                "chunk_text": chunk.page_content,
+                "chunk_order": idx,
+                "chunk_project_id": project_id,
+                "file_id": file_id,
+                "metadata": getattr(chunk, "metadata", None),
+                # Packed float32 (BinData) instead of an array of doubles; see DataChunk.vector()
+                "embedding": vectors[idx - 1].tobytes() if idx <= embedding_count else None
+            }
+            for idx, chunk in enumerate(chunks, start=1)
+        ]
         
-        if chunk_documents:
-            result = await self.collection.insert_many(chunk_documents)
-            return len(result.inserted_ids)
-        return 0
+        # Unordered inserts let the server apply the batch without serializing on each document
+        result = await self.collection.insert_many(chunk_documents, ordered=False)
+        return len(result.inserted_ids)
     
-    async def get_chunks_by_project(self, project_id: ObjectId, limit: int = 100) -> List[DataChunk]:
+    async def get_chunks_by_project(self, project_id: ObjectId, limit: int = 100,
+                                    include_embeddings: bool = False) -> List[DataChunk]:
         """
         Get chunks for a project.
         
         Args:
             project_id: ObjectId of the project
             limit: Maximum number of chunks to return
+            include_embeddings: Whether to load the embedding vectors
             
         Returns:
             List[DataChunk]: List of DataChunk objects
         """
         cursor = self.collection.find(
-            {"chunk_project_id": project_id}
-        ).sort("chunk_order", 1).limit(limit)
+            {"chunk_project_id": project_id},
+            projection=self._chunk_projection(include_embeddings)
+        ).sort("chunk_order", 1).limit(limit).batch_size(CURSOR_BATCH_SIZE)
         
-        chunks = []
-        async for doc in cursor:
-            chunks.append(DataChunk(**doc))
-        return chunks
+        # Documents were validated when written, so skip pydantic validation here
+        return [DataChunk.model_construct(**doc) async for doc in cursor]
     
-    async def get_chunks_by_file(self, project_id: ObjectId, file_id: str) -> List[DataChunk]:
+    async def get_chunks_by_file(self, project_id: ObjectId, file_id: str,
+                                 include_embeddings: bool = False) -> List[DataChunk]:
         """
         Get chunks for a specific file.
         
         Args:
             project_id: ObjectId of the project
             file_id: String identifier of the file
+            include_embeddings: Whether to load the embedding vectors
             
         Returns:
             List[DataChunk]: List of DataChunk objects
         """
-        cursor = self.collection.find({
-            "chunk_project_id": project_id,
-            "file_id": file_id
-        }).sort("chunk_order", 1)
+        cursor = self.collection.find(
+            {
+                "chunk_project_id": project_id,
+                "file_id": file_id
+            },
+            projection=self._chunk_projection(include_embeddings)
+        ).sort("chunk_order", 1).batch_size(CURSOR_BATCH_SIZE)
         
-        chunks = []
-        async for doc in cursor:
-            chunks.append(DataChunk(**doc))
-        return chunks
+        # Documents were validated when written, so skip pydantic validation here
+        return [DataChunk.model_construct(**doc) async for doc in cursor]
+    
+    @staticmethod
+    def _chunk_projection(include_embeddings: bool):
+        # Embedding vectors dominate the document size; leave them on the server unless asked for
+        return None if include_embeddings else {"embedding": 0}
     
     async def delete_chunks_by_file(self, project_id: ObjectId, file_id: str) -> int:
         """
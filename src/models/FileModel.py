@@ -0,0 +1,72 @@
+from .BaseDataModel import BaseDataModel
+from .db_schemas import DataFile
+from .enums import DataBaseEnum
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+from typing import Optional
+
+# Insert attempts when a duplicate record keeps disappearing between insert and lookup
+_CREATE_ATTEMPTS = 3
+
+class FileModel(BaseDataModel):
+
+    def __init__(self, db_client):
+        super().__init__(db_client)
+        self.collection = self.db_client[DataBaseEnum.COLLECTION_FILE_NAME.value]
+    
+    async def get_file_by_hash(self, project_id: ObjectId, content_hash: str) -> Optional[DataFile]:
+        """
+        Find a file already uploaded to the project with the same content.
+        
+        Args:
+            project_id: ObjectId of the project
+            content_hash: Hex digest of the file content
+            
+        Returns:
+            Optional[DataFile]: The stored file record, or None
+        """
+        record = await self.collection.find_one({
+            "file_project_id": project_id,
+            "content_hash": content_hash
+        })
+        if record is None:
+            return None
+        return DataFile.model_construct(**record)
+    
+    async def create_file_or_get_existing(self, data_file: DataFile) -> DataFile:
+        """
+        Store a file record, unless one with the same content already exists
+        in the project (enforced by a unique index on project + hash).
+        
+        Args:
+            data_file: File record to store
+            
+        Returns:
+            DataFile: The stored record; file_id differs from data_file's if it was a duplicate
+        """
+        for _ in range(_CREATE_ATTEMPTS):
+            try:
+                await self.collection.insert_one(data_file.model_dump())
+                return data_file
+            except DuplicateKeyError:
+                # Another upload with the same content won the race
+                existing = await self.get_file_by_hash(data_file.file_project_id, data_file.content_hash)
+                if existing is not None:
+                    return existing
+                # The winning record was removed in the meantime; try the insert again
+        # Still contended: treat this upload as the canonical file rather than failing it
+        return data_file
+    
+    async def replace_file(self, data_file: DataFile) -> DataFile:
+        """
+        Point an existing content hash at a new file_id (e.g. after the old file was removed from disk).
+        """
+        await self.collection.update_one(
+            {
+                "file_project_id": data_file.file_project_id,
+                "content_hash": data_file.content_hash
+            },
+            {"$set": {"file_id": data_file.file_id}},
+            upsert=True
+        )
+        return data_file
@@ -1,3 +1,4 @@
 from .enums import ResponseSignal
 from .enums import ProcessingEnum
-from .ChunkModel import ChunkModel
\ No newline at end of file
+from .ChunkModel import ChunkModel
+from .FileModel import FileModel
\ No newline at end of file
@@ -1,6 +1,7 @@
 from pydantic import BaseModel , Field , ConfigDict
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 from bson.objectid import ObjectId
+import numpy as np
 
 class DataChunk(BaseModel):
         model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -10,5 +11,16 @@ class DataChunk(BaseModel):
         chunk_project_id : ObjectId
         file_id : Optional[str] = None
         metadata : Optional[Dict[str, Any]] = None
-        embedding : Optional[List[float]] = None
+        # float32 vector packed with ndarray.tobytes(); chunks saved before the packed format
+        # still hold a list of floats, which vector() also accepts
+        embedding : Optional[Union[bytes, List[float]]] = None
+
+        def vector(self) -> Optional[np.ndarray]:
+                """Return the stored embedding as a float32 array (no copy for the packed format)."""
+                if self.embedding is None:
+                        return None
+                if isinstance(self.embedding, (bytes, bytearray)):
+                        return np.frombuffer(self.embedding, dtype=np.float32)
+                # Legacy documents: array of doubles
+                return np.asarray(self.embedding, dtype=np.float32)
         
\ No newline at end of file
@@ -0,0 +1,10 @@
+from pydantic import BaseModel , Field , ConfigDict
+from typing import Optional
+from bson.objectid import ObjectId
+
+class DataFile(BaseModel):
+        model_config = ConfigDict(arbitrary_types_allowed=True)
+        _id : Optional[ObjectId] = None
+        file_project_id : ObjectId
+        file_id : str = Field(... , min_length = 1)
+        content_hash : str = Field(... , min_length = 1)  # hex BLAKE2b digest of the file bytes
@@ -1,2 +1,3 @@
 from .project import project
 from .DataChunk import DataChunk
+from .DataFile import DataFile
@@ -3,5 +3,6 @@ from enum import Enum
 class DataBaseEnum(Enum):
     COLLECTION_PROJECT_NAME = "projects"
     COLLECTION_CHUNK_NAME = "chunks"
+    COLLECTION_FILE_NAME = "files"
 
     
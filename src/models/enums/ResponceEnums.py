@@ -5,6 +5,7 @@ class ResponseSignal(Enum):
     file_size_exceeded = "File size exceeded the maximum limit."
     success_file_upload = "File uploaded successfully."
     failed_file_upload = "File upload failed."
+    file_already_exists = "File already uploaded to this project."
     FILE_VALIDATED_SUCCESSFULLY = "FILE_VALIDATED_SUCCESSFULLY"
     PROCESS_FAILED = "process failed"
     PROCESS_SUCCESS = "process success"
\ No newline at end of file
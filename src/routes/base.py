@@ -9,7 +9,6 @@ base_router = APIRouter(
 @base_router.get("/welcome")
 
 async def welcome (app_settings:Settings= Depends(get_settings)):
-    app_settings = get_settings()
 
     return{"status" : "running",
            "name ": app_settings.APPLICATION_NAME , 
@@ -1,23 +1,37 @@
 # upload data 
 
 from fastapi import FastAPI , APIRouter , UploadFile , Depends , status , Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from helpers import get_settings , Settings 
 from controllers import ProjectController , ProcessController , DataController
 import os 
-import aiofiles
+import asyncio
 from models import ResponseSignal
 import logging
 from .schemes import ProcessRequest, SearchRequest, ChatRequest
 from models.ProjectModel import ProjectModel
 from models.ChunkModel import ChunkModel
-from services import EmbeddingService, VectorDBService, RAGService
+from models.FileModel import FileModel
+from models.db_schemas import DataFile
 
 
 logger = logging.getLogger("uvicorn.error")
+
+# Content-Length covers the whole multipart body; leave room for boundaries and part headers
+MULTIPART_OVERHEAD_ALLOWANCE = 16 * 1024
+
 data_router = APIRouter(prefix="/api/v1/data" , 
                         tags= ["api " , "router"])
 
+def list_project_files(project_path: str, limit: int = 10):
+    """Return up to `limit` file names from the project directory without listing all of it."""
+    try:
+        with os.scandir(project_path) as entries:
+            return [entry.name for _, entry in zip(range(limit), entries)]
+    except FileNotFoundError:
+        return []
+
+
 @data_router.get("/debug/files/{project_id}")
 async def debug_list_files(request: Request, project_id: str):
     """Debug endpoint to list all files in a project"""
@@ -29,7 +43,7 @@ async def debug_list_files(request: Request, project_id: str):
         if os.path.exists(project_path):
             files = os.listdir(project_path)
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "project_id": project_id,
@@ -41,57 +55,94 @@ async def debug_list_files(request: Request, project_id: str):
         )
     except Exception as e:
         logger.error(f"Error in debug endpoint: {e}", exc_info=True)
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"error": str(e)}
         )
 @data_router.post("/upload/{project_id}")
 async def upload_data(request:Request, project_id:str, file:UploadFile,
                       app_settings:Settings =Depends(get_settings)):
+    # Reject uploads whose advertised size is already over the limit before touching the file
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and \
+            int(content_length) > app_settings.FILE_MAX_SIZE + MULTIPART_OVERHEAD_ALLOWANCE:
+        return ORJSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={
+                "signal": ResponseSignal.file_size_exceeded.value
+            }
+        )
+    
     project_model = ProjectModel(
          db_client=request.app.db_client
     )
     project = await project_model.get_project_or_create_one(project_id=project_id)
     
-    # Validate the file properties (now async and returns file_content)
     data_controller = DataController()
-    is_valid, result_signal, file_content = await data_controller.validate_uploaded_file(file=file)
-    
-    if not is_valid:
-        return JSONResponse(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            content={
-                "signal": result_signal  # Use the actual signal from validation
-            }
-        )
     
     try:
-        # Generate file path
-        clean_file_path, file_id = data_controller.generate_unique_file_path(
-            orig_file_name=file.filename or "unknown", 
-            project_id=project_id
-        )
-        
-        logger.info(f"Uploading file - Original filename: {file.filename}")
-        logger.info(f"Uploading file - Generated file_id: {file_id}")
-        logger.info(f"Uploading file - Full path: {clean_file_path}")
-        
-        # Write the pre-read file content to disk
-        async with aiofiles.open(clean_file_path, "wb") as f:
-            await f.write(file_content)
+        while True:
+            # Generate file path
+            clean_file_path, file_id = data_controller.generate_unique_file_path(
+                orig_file_name=file.filename or "unknown", 
+                project_id=project_id
+            )
+            
+            # Validate the file properties while streaming it to disk
+            try:
+                is_valid, result_signal, content_hash = await data_controller.validate_and_save(
+                    file=file,
+                    dest_path=clean_file_path,
+                    max_size=app_settings.FILE_MAX_SIZE,
+                    chunk_size=app_settings.FILE_CHUNK_SIZE
+                )
+                break
+            except FileExistsError:
+                # Random prefix collided with an existing file, try another one
+                continue
         
-        logger.info(f"File saved successfully: {clean_file_path}")
+        logger.debug("Uploading file %s as %s (%s)", file.filename, file_id, clean_file_path)
        
     except Exception as e:
         logger.error(f"error while uploading file : {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_400_BAD_REQUEST, 
             content={
                 "signal": ResponseSignal.failed_file_upload.value
             }
         )
+    
+    if not is_valid:
+        return ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": result_signal  # Use the actual signal from validation
+            }
+        )
+    
+    # Skip storing (and later re-embedding) content this project already has
+    file_model = FileModel(db_client=request.app.db_client)
+    data_file = DataFile(file_project_id=project._id, file_id=file_id, content_hash=content_hash)
+    stored_file = await file_model.create_file_or_get_existing(data_file)
+    
+    if stored_file.file_id != file_id:
+        existing_path = os.path.join(os.path.dirname(clean_file_path), stored_file.file_id)
+        if os.path.exists(existing_path):
+            os.remove(clean_file_path)
+            logger.debug("Duplicate upload of %s, discarded %s", stored_file.file_id, file_id)
+            return ORJSONResponse(
+                content={
+                    "signal": ResponseSignal.file_already_exists.value,
+                    "file_id": stored_file.file_id,
+                    "project_id": str(project._id) if project._id else project_id
+                }
+            )
+        # The earlier copy is gone from disk; the new upload takes over its hash
+        await file_model.replace_file(data_file)
+    
+    logger.debug("File saved successfully: %s", clean_file_path)
      
-    return JSONResponse(
+    return ORJSONResponse(
         content={
             "signal": ResponseSignal.success_file_upload.value,
             "file_id": file_id,
@@ -105,14 +156,13 @@ async def upload_data(request:Request, project_id:str, file:UploadFile,
 @data_router.post("/process/{project_id}")
 async def process_endpoint(request: Request, project_id : str , process_request :ProcessRequest ):
     try:
-        logger.info(f"=== PROCESS REQUEST RECEIVED ===")
-        logger.info(f"Project ID: '{project_id}'")
-        logger.info(f"Request body: {process_request.model_dump() if hasattr(process_request, 'model_dump') else process_request}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Process request for project '%s': %s", project_id, process_request.model_dump())
         
         # Validate request
         if not hasattr(process_request, 'file_id') or process_request.file_id is None:
             logger.error("file_id is missing from request")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -123,11 +173,11 @@ async def process_endpoint(request: Request, project_id : str , process_request
         # Strip whitespace and clean file_id
         file_id = process_request.file_id.strip().rstrip(',')
         
-        logger.info(f"Processing file_id: '{file_id}' (original: '{process_request.file_id}')")
+        logger.debug("Processing file_id: '%s' (original: '%s')", file_id, process_request.file_id)
         
         if not file_id:
             logger.error("file_id is empty after stripping")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -141,7 +191,7 @@ async def process_endpoint(request: Request, project_id : str , process_request
         
         if not project._id:
             logger.error(f"Invalid project: {project_id}")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -156,32 +206,34 @@ async def process_endpoint(request: Request, project_id : str , process_request
         project_path = process_controller.project_path
         file_path = os.path.join(project_path, file_id)
         
-        logger.info(f"Looking for file at: {file_path}")
+        logger.debug("Looking for file at: %s", file_path)
         
-        if not os.path.exists(file_path):
+        # One stat on the happy path; the directory is only scanned to build the error hint
+        if not os.path.isfile(file_path):
             logger.error(f"File not found: {file_path}")
-            # List available files for debugging
-            available_files = []
-            if os.path.exists(project_path):
-                available_files = os.listdir(project_path)
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
                     "error": f"File not found: {file_id}. Please upload the file first.",
                     "file_path": file_path,
-                    "available_files": available_files[:10]  # Show first 10 files for debugging
+                    "available_files": list_project_files(project_path)  # Show first 10 files for debugging
                 }
             )
         
-        logger.info(f"File found, loading content...")
+        logger.debug("File found, loading content...")
         try:
-            file_content = process_controller.get_file_content(file_id=file_id)
-            logger.info(f"File content loaded successfully: {len(file_content)} documents/pages")
+            # Parse in the worker pool so the event loop keeps serving other requests;
+            # PDF page ranges are extracted by several workers in parallel
+            file_content = await process_controller.aget_file_content(
+                file_id=file_id,
+                executor=request.app.pdf_pool
+            )
+            logger.debug("File content loaded successfully: %d documents/pages", len(file_content))
             
             if not file_content or len(file_content) == 0:
                 logger.error("File loaded but contains no content")
-                return JSONResponse(
+                return ORJSONResponse(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     content={
                         "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -190,7 +242,7 @@ async def process_endpoint(request: Request, project_id : str , process_request
                 )
         except ValueError as e:
             logger.error(f"Unsupported file type or validation error: {e}")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -200,7 +252,7 @@ async def process_endpoint(request: Request, project_id : str , process_request
             )
         except FileNotFoundError as e:
             logger.error(f"File not found error during loading: {e}")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -210,8 +262,8 @@ async def process_endpoint(request: Request, project_id : str , process_request
                 }
             )
         except Exception as e:
-            logger.error(f"Error loading file content: {e}", exc_info=True)
-            return JSONResponse(
+            logger.error("Error loading file content: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -221,18 +273,20 @@ async def process_endpoint(request: Request, project_id : str , process_request
                 }
             )
         
-        logger.info(f"Creating chunks from {len(file_content)} documents...")
+        logger.debug("Creating chunks from %d documents...", len(file_content))
         try:
-            chunks = process_controller.process_file_content(
+            # Split page groups in the worker pool, like parsing above
+            chunks = await process_controller.process_file_content_in_pool(
                 file_content=file_content,
                 file_id=file_id,
+                executor=request.app.pdf_pool,
                 chunk_size=process_request.chunk_size or 1000,
                 overlap_size=process_request.overlap_size or 200
             )
-            logger.info(f"Created {len(chunks) if chunks else 0} chunks")
+            logger.debug("Created %d chunks", len(chunks) if chunks else 0)
         except Exception as e:
-            logger.error(f"Error creating chunks: {e}", exc_info=True)
-            return JSONResponse(
+            logger.error("Error creating chunks: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -243,7 +297,7 @@ async def process_endpoint(request: Request, project_id : str , process_request
         
         if not chunks or len(chunks) == 0:
             logger.error("No chunks created from file content")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal" : ResponseSignal.PROCESS_FAILED.value,
@@ -256,46 +310,58 @@ async def process_endpoint(request: Request, project_id : str , process_request
         embeddings = None
         embeddings_generated = 0
         try:
-            embedding_service = EmbeddingService()
+            embedding_service = request.app.embedding_service
             chunk_texts = [chunk.page_content for chunk in chunks]
-            embeddings = embedding_service.generate_embeddings_batch(chunk_texts)
-            embeddings_generated = len(embeddings) if embeddings else 0
-            logger.info(f"Generated {embeddings_generated} embeddings for {len(chunks)} chunks")
+            embeddings = await embedding_service.agenerate_embeddings_batch(chunk_texts)
+            embeddings_generated = len(embeddings) if embeddings is not None else 0
+            logger.debug("Generated %d embeddings for %d chunks", embeddings_generated, len(chunks))
         except Exception as e:
-            logger.error(f"Error generating embeddings: {e}", exc_info=True)
+            logger.error("Error generating embeddings: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             # For MVP, continue without embeddings - chunks will still be saved
             embeddings = None
         
-        # Save chunks to MongoDB with embeddings
+        # Save chunks to MongoDB and store embeddings in ChromaDB concurrently;
+        # the Chroma client is sync, so it runs in a worker thread
         chunk_model = ChunkModel(db_client=request.app.db_client)
-        saved_count = await chunk_model.save_chunks(
+        save_task = chunk_model.save_chunks(
             chunks=chunks,
             project_id=project._id,
             file_id=file_id,
             embeddings=embeddings
         )
         
-        # Store embeddings in ChromaDB
+        if embeddings is not None and len(embeddings) > 0:
+            chromadb_task = asyncio.to_thread(
+                request.app.vector_db_service.add_chunks,
+                project_id=project_id,
+                chunks=chunks,
+                embeddings=embeddings,
+                file_id=file_id
+            )
+            saved_count, chromadb_result = await asyncio.gather(
+                save_task, chromadb_task, return_exceptions=True
+            )
+        else:
+            saved_count, chromadb_result = await save_task, 0
+        
+        # MongoDB is the source of truth - its failure fails the request
+        if isinstance(saved_count, BaseException):
+            raise saved_count
+        
         chromadb_stored = False
         chromadb_count = 0
-        if embeddings and len(embeddings) > 0:
-            try:
-                vector_db_service = VectorDBService()
-                chromadb_count = vector_db_service.add_chunks(
-                    project_id=project_id,
-                    chunks=chunks,
-                    embeddings=embeddings,
-                    file_id=file_id
-                )
-                chromadb_stored = chromadb_count > 0
-                logger.info(f"Stored {chromadb_count} chunks in ChromaDB for project {project_id}")
-            except Exception as e:
-                logger.error(f"Error storing chunks in ChromaDB: {e}", exc_info=True)
-                # Don't fail the request if ChromaDB fails - MongoDB is the source of truth
-                chromadb_stored = False
-                chromadb_count = 0
+        if isinstance(chromadb_result, BaseException):
+            # Don't fail the request if ChromaDB fails
+            logger.error(
+                "Error storing chunks in ChromaDB: %s", chromadb_result,
+                exc_info=chromadb_result if logger.isEnabledFor(logging.DEBUG) else None
+            )
+        else:
+            chromadb_count = chromadb_result
+            chromadb_stored = chromadb_count > 0
+            logger.debug("Stored %d chunks in ChromaDB for project %s", chromadb_count, project_id)
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "signal": ResponseSignal.PROCESS_SUCCESS.value,
@@ -307,11 +373,8 @@ async def process_endpoint(request: Request, project_id : str , process_request
             }
         )
     except Exception as e:
-        logger.error(f"Unexpected error processing file: {e}", exc_info=True)
-        import traceback
-        error_trace = traceback.format_exc()
-        logger.error(f"Full traceback: {error_trace}")
-        return JSONResponse(
+        logger.exception("Unexpected error processing file")
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -328,14 +391,13 @@ async def search_endpoint(request: Request, project_id: str, search_request: Sea
     Search for similar chunks using vector similarity search.
     """
     try:
-        logger.info(f"=== SEARCH REQUEST RECEIVED ===")
-        logger.info(f"Project ID: '{project_id}'")
-        logger.info(f"Query: '{search_request.query}'")
-        logger.info(f"Top K: {search_request.top_k}")
-        logger.info(f"File ID filter: {search_request.file_id}")
+        logger.debug(
+            "Search request for project '%s': query=%r top_k=%s file_id=%s",
+            project_id, search_request.query, search_request.top_k, search_request.file_id
+        )
         
         if not search_request.query or not search_request.query.strip():
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -348,7 +410,7 @@ async def search_endpoint(request: Request, project_id: str, search_request: Sea
         project = await project_model.get_project_or_create_one(project_id=project_id)
         
         if not project._id:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -358,12 +420,12 @@ async def search_endpoint(request: Request, project_id: str, search_request: Sea
         
         # Generate embedding for query
         try:
-            embedding_service = EmbeddingService()
-            query_embedding = embedding_service.generate_embedding(search_request.query.strip())
-            logger.info(f"Generated query embedding: {len(query_embedding)} dimensions")
+            embedding_service = request.app.embedding_service
+            query_embedding = await embedding_service.agenerate_embedding(search_request.query.strip())
+            logger.debug("Generated query embedding: %d dimensions", len(query_embedding))
         except Exception as e:
-            logger.error(f"Error generating query embedding: {e}", exc_info=True)
-            return JSONResponse(
+            logger.error("Error generating query embedding: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return ORJSONResponse(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -373,31 +435,33 @@ async def search_endpoint(request: Request, project_id: str, search_request: Sea
         
         # Search ChromaDB for similar chunks
         try:
-            vector_db_service = VectorDBService()
+            vector_db_service = request.app.vector_db_service
             top_k = search_request.top_k or 5
             
-            results = vector_db_service.search_similar(
+            results = vector_db_service.search_similar_columns(
                 project_id=project_id,
                 query_embedding=query_embedding,
                 top_k=top_k,
                 file_id=search_request.file_id
             )
             
-            logger.info(f"Found {len(results)} similar chunks")
+            logger.debug("Found %d similar chunks", len(results["ids"]))
             
-            # Format results for response
-            formatted_results = []
-            for result in results:
-                formatted_result = {
-                    "chunk_text": result.get("chunk_text", ""),
-                    "file_id": result.get("metadata", {}).get("file_id", ""),
-                    "chunk_order": result.get("metadata", {}).get("chunk_order", 0),
-                    "distance": result.get("distance"),
-                    "metadata": result.get("metadata", {})
+            # Format results for response straight from the columnar search result
+            formatted_results = [
+                {
+                    "chunk_text": document,
+                    "file_id": metadata.get("file_id", ""),
+                    "chunk_order": metadata.get("chunk_order", 0),
+                    "distance": distance,
+                    "metadata": metadata
                 }
-                formatted_results.append(formatted_result)
+                for document, metadata, distance in zip(
+                    results["documents"], results["metadatas"], results["distances"]
+                )
+            ]
             
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_200_OK,
                 content={
                     "signal": ResponseSignal.PROCESS_SUCCESS.value,
@@ -408,8 +472,8 @@ async def search_endpoint(request: Request, project_id: str, search_request: Sea
             )
             
         except Exception as e:
-            logger.error(f"Error searching ChromaDB: {e}", exc_info=True)
-            return JSONResponse(
+            logger.error("Error searching ChromaDB: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return ORJSONResponse(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -419,7 +483,7 @@ async def search_endpoint(request: Request, project_id: str, search_request: Sea
             
     except Exception as e:
         logger.error(f"Unexpected error in search endpoint: {e}", exc_info=True)
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -435,14 +499,13 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
     Chat endpoint for RAG queries. Generates AI responses based on document context.
     """
     try:
-        logger.info(f"=== CHAT REQUEST RECEIVED ===")
-        logger.info(f"Project ID: '{project_id}'")
-        logger.info(f"Query: '{chat_request.query}'")
-        logger.info(f"File ID filter: {chat_request.file_id}")
-        logger.info(f"Top K: {chat_request.top_k}")
+        logger.debug(
+            "Chat request for project '%s': query=%r top_k=%s file_id=%s",
+            project_id, chat_request.query, chat_request.top_k, chat_request.file_id
+        )
         
         if not chat_request.query or not chat_request.query.strip():
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -455,7 +518,7 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
         project = await project_model.get_project_or_create_one(project_id=project_id)
         
         if not project._id:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -465,8 +528,8 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
         
         # Generate answer using RAG service
         try:
-            rag_service = RAGService()
-            result = rag_service.generate_answer(
+            rag_service = request.app.rag_service
+            result = await rag_service.generate_answer(
                 project_id=project_id,
                 query=chat_request.query.strip(),
                 file_id=chat_request.file_id,
@@ -476,7 +539,7 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
             # Check if LLM generation failed (graceful degradation)
             if result.get("error"):
                 logger.warning(f"RAG pipeline completed with error: {result.get('error')}")
-                return JSONResponse(
+                return ORJSONResponse(
                     status_code=status.HTTP_200_OK,
                     content={
                         "signal": ResponseSignal.PROCESS_SUCCESS.value,
@@ -489,9 +552,9 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
                     }
                 )
             
-            logger.info(f"RAG pipeline completed: {result.get('chunks_retrieved', 0)} chunks, answer generated")
+            logger.debug("RAG pipeline completed: %d chunks, answer generated", result.get("chunks_retrieved", 0))
             
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_200_OK,
                 content={
                     "signal": ResponseSignal.PROCESS_SUCCESS.value,
@@ -504,7 +567,7 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
             
         except ValueError as e:
             logger.error(f"Validation error in RAG service: {e}")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={
                     "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -513,11 +576,11 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
             )
         except RuntimeError as e:
             error_msg = str(e)
-            logger.error(f"RAG service error: {error_msg}", exc_info=True)
+            logger.error("RAG service error: %s", error_msg, exc_info=logger.isEnabledFor(logging.DEBUG))
             
             # Check for specific error types
             if "API key" in error_msg or "invalid" in error_msg.lower():
-                return JSONResponse(
+                return ORJSONResponse(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     content={
                         "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -526,7 +589,7 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
                     }
                 )
             elif "rate limit" in error_msg.lower():
-                return JSONResponse(
+                return ORJSONResponse(
                     status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                     content={
                         "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -534,7 +597,7 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
                     }
                 )
             else:
-                return JSONResponse(
+                return ORJSONResponse(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     content={
                         "signal": ResponseSignal.PROCESS_FAILED.value,
@@ -544,11 +607,59 @@ async def chat_endpoint(request: Request, project_id: str, chat_request: ChatReq
             
     except Exception as e:
         logger.error(f"Unexpected error in chat endpoint: {e}", exc_info=True)
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={
                 "signal": ResponseSignal.PROCESS_FAILED.value,
                 "error": f"Unexpected error: {str(e)}",
                 "error_type": type(e).__name__
             }
-        )
\ No newline at end of file
+        )
+
+
+@data_router.post("/chat/{project_id}/stream")
+async def chat_stream_endpoint(request: Request, project_id: str, chat_request: ChatRequest):
+    """
+    Streaming chat endpoint: returns the answer as plain text while the LLM generates it.
+    Without a configured LLM, responds like /chat (search results only).
+    """
+    rag_service = request.app.rag_service
+    if not rag_service.llm_available:
+        return await chat_endpoint(request, project_id, chat_request)
+    
+    if not chat_request.query or not chat_request.query.strip():
+        return ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.PROCESS_FAILED.value,
+                "error": "Query cannot be empty"
+            }
+        )
+    
+    project_model = ProjectModel(db_client=request.app.db_client)
+    project = await project_model.get_project_or_create_one(project_id=project_id)
+    
+    if not project._id:
+        return ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "signal": ResponseSignal.PROCESS_FAILED.value,
+                "error": "Invalid project"
+            }
+        )
+    
+    async def answer_stream():
+        try:
+            async for delta in rag_service.astream_answer(
+                project_id=project_id,
+                query=chat_request.query.strip(),
+                file_id=chat_request.file_id,
+                top_k=chat_request.top_k
+            ):
+                yield delta
+        except Exception as e:
+            # Headers are already sent; end the stream with the error text
+            logger.error("Error streaming chat answer: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            yield f"\n\n[error] {e}"
+    
+    return StreamingResponse(answer_stream(), media_type="text/plain; charset=utf-8")
@@ -1,11 +1,29 @@
 from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import List, Tuple, Dict, Any, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
 from helpers import get_settings
+from .QueryEmbeddingCache import QueryEmbeddingCache
+import asyncio
 import logging
+import os
+import threading
 import torch
 
 logger = logging.getLogger(__name__)
 
+# Texts used to check that a quantized model still agrees with the full-precision one
+_QUANT_CANARY_TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Photosynthesis converts light energy into chemical energy.",
+    "Interest rates affect the price of government bonds.",
+]
+_QUANT_MIN_COSINE = 0.99
+
+# Distinct query strings whose embeddings are kept in memory
+_QUERY_CACHE_SIZE = 2048
+
 class EmbeddingService:
     """
     Service for generating vector embeddings from text using Sentence Transformers.
@@ -14,12 +32,28 @@ class EmbeddingService:
     
     _model_instance = None
     _model_name = None
+    _autocast_bf16 = False  # set with _model_instance when IPEX converted it to bfloat16
+    _disk_cache_instance = None
+    
+    # LRU of query embeddings keyed by (model_name, text), shared by all instances
+    _query_cache: "OrderedDict[Tuple[str, str], Tuple[float, ...]]" = OrderedDict()
+    _query_cache_lock = threading.Lock()
+    _query_cache_hits = 0
+    _query_cache_misses = 0
     
     def __init__(self):
         """Initialize the embedding service with model configuration."""
         self.settings = get_settings()
         self.model_name = self.settings.EMBEDDING_MODEL
         self.device = self.settings.EMBEDDING_DEVICE
+        self.quantization = self.settings.EMBEDDING_QUANT.lower()
+        self.backend = self.settings.EMBEDDING_BACKEND.lower()
+        
+        # Dynamic batching of concurrent query encodes (see start_batcher)
+        self.max_batch = self.settings.EMBEDDING_QUEUE_MAX_BATCH
+        self.max_wait = self.settings.EMBEDDING_QUEUE_MAX_WAIT_MS / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher_task: Optional[asyncio.Task] = None
         
         # Use GPU if available and device is set to auto
         if self.device == "cpu":
@@ -31,18 +65,57 @@ class EmbeddingService:
         
         # Load model (singleton pattern - reuse same instance)
         self._load_model()
+        self.disk_cache = self._open_disk_cache()
+    
+    def _open_disk_cache(self) -> Optional[QueryEmbeddingCache]:
+        """Open the persistent query embedding cache (shared by all instances); None if disabled."""
+        cache_dir = self.settings.EMBEDDING_CACHE_DIR
+        if not cache_dir:
+            return None
+        if EmbeddingService._disk_cache_instance is None:
+            if not os.path.isabs(cache_dir):
+                cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), cache_dir)
+            try:
+                EmbeddingService._disk_cache_instance = QueryEmbeddingCache(
+                    directory=cache_dir,
+                    ttl_seconds=self.settings.EMBEDDING_CACHE_TTL,
+                    dimension=self.settings.EMBEDDING_DIMENSION
+                )
+                logger.info(f"Query embedding cache at: {cache_dir}")
+            except Exception as e:
+                logger.warning(f"Could not open query embedding cache at {cache_dir}: {e}")
+                return None
+        return EmbeddingService._disk_cache_instance
     
     def _load_model(self):
         """Load the SentenceTransformer model (lazy loading, cached)."""
         # Use class-level caching to avoid reloading the same model
         if EmbeddingService._model_instance is None or EmbeddingService._model_name != self.model_name:
             try:
-                logger.info(f"Loading embedding model: {self.model_name} on device: {self.device}")
-                EmbeddingService._model_instance = SentenceTransformer(
+                logger.info(f"Loading embedding model: {self.model_name} on device: {self.device} (backend: {self.backend})")
+                # Non-torch backends (onnx, openvino) need sentence-transformers>=3.2 and optimum;
+                # ipex loads the PyTorch model and optimizes it afterwards
+                backend_kwargs = {} if self.backend in ("torch", "ipex") else {"backend": self.backend}
+                model = SentenceTransformer(
                     self.model_name,
-                    device=self.device
+                    device=self.device,
+                    **backend_kwargs
                 )
+                # Inference only: no dropout, and encode calls run under torch.inference_mode()
+                model.eval()
+                autocast_bf16 = False
+                if self.backend == "torch":
+                    # Quantization and compilation act on the PyTorch weights
+                    model = self._quantize_model(model)
+                    if self.settings.EMBEDDING_COMPILE:
+                        model = self._compile_model(model)
+                elif self.backend == "ipex":
+                    model, autocast_bf16 = self._ipex_optimize_model(model)
+                EmbeddingService._model_instance = model
+                EmbeddingService._autocast_bf16 = autocast_bf16
                 EmbeddingService._model_name = self.model_name
+                # Cached vectors belong to the previous model
+                EmbeddingService._clear_query_cache()
                 logger.info(f"Model {self.model_name} loaded successfully")
             except Exception as e:
                 logger.error(f"Error loading embedding model {self.model_name}: {e}", exc_info=True)
@@ -50,6 +123,91 @@ class EmbeddingService:
         
         self.model = EmbeddingService._model_instance
     
+    def _quantize_model(self, model: SentenceTransformer) -> SentenceTransformer:
+        """
+        Apply EMBEDDING_QUANT: fp16 weights on CUDA, dynamic int8 Linear layers on CPU.
+        Canary texts are encoded before and after, and a warning is logged
+        if the quantized embeddings drift from the full-precision ones.
+        """
+        if self.quantization == "none":
+            return model
+        
+        if self.quantization == "fp16" and self.device == "cuda":
+            quantize = lambda m: m.half()
+        elif self.quantization == "int8" and self.device == "cpu":
+            quantize = lambda m: torch.quantization.quantize_dynamic(m, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            logger.warning(
+                f"EMBEDDING_QUANT={self.quantization} is not supported on device {self.device}, "
+                f"keeping full precision"
+            )
+            return model
+        
+        with torch.inference_mode():
+            reference = model.encode(_QUANT_CANARY_TEXTS, convert_to_numpy=True,
+                                     normalize_embeddings=True, show_progress_bar=False)
+        model = quantize(model)
+        with torch.inference_mode():
+            quantized = model.encode(_QUANT_CANARY_TEXTS, convert_to_numpy=True,
+                                     normalize_embeddings=True, show_progress_bar=False)
+        
+        min_cosine = float(np.min(np.sum(reference * quantized.astype(np.float32), axis=1)))
+        if min_cosine < _QUANT_MIN_COSINE:
+            logger.warning(f"Quantized ({self.quantization}) embeddings drift from full precision: min cosine {min_cosine:.4f}")
+        else:
+            logger.info(f"Embedding model quantized to {self.quantization} (min canary cosine {min_cosine:.4f})")
+        return model
+    
+    def _compile_model(self, model: SentenceTransformer) -> SentenceTransformer:
+        """Compile the underlying transformer with torch.compile (CUDA only)."""
+        if self.device != "cuda":
+            logger.warning("EMBEDDING_COMPILE is only applied on cuda, keeping eager mode")
+            return model
+        
+        transformer = model[0]
+        transformer.auto_model = torch.compile(transformer.auto_model, mode="reduce-overhead")
+        logger.info("Embedding model compiled with torch.compile (reduce-overhead)")
+        return model
+    
+    def _ipex_optimize_model(self, model: SentenceTransformer) -> Tuple[SentenceTransformer, bool]:
+        """
+        Optimize the underlying transformer with Intel Extension for PyTorch (CPU only).
+        Weights are converted to bfloat16 so AMX/AVX-512 bf16 kernels are used; the
+        SentenceTransformer wrapper is kept so encode() works unchanged.
+        
+        Returns:
+            Tuple: (model, whether encode calls need bf16 autocast)
+        """
+        if self.device != "cpu":
+            logger.warning("EMBEDDING_BACKEND=ipex is only applied on cpu, keeping plain PyTorch")
+            return model, False
+        
+        try:
+            import intel_extension_for_pytorch as ipex
+        except ImportError:
+            logger.warning("intel_extension_for_pytorch is not installed, keeping plain PyTorch")
+            return model, False
+        
+        transformer = model[0]
+        transformer.auto_model = ipex.optimize(transformer.auto_model, dtype=torch.bfloat16)
+        logger.info("Embedding model optimized with IPEX (bfloat16)")
+        return model, True
+    
+    @contextmanager
+    def _inference(self):
+        """Context for encode calls: inference mode, plus bf16 autocast for the IPEX model."""
+        with torch.inference_mode():
+            if EmbeddingService._autocast_bf16:
+                with torch.autocast("cpu", dtype=torch.bfloat16):
+                    yield
+            else:
+                yield
+    
+    def warmup(self):
+        """Run one throwaway encode so the first request doesn't pay for lazy device setup."""
+        with self._inference():
+            self.model.encode(["warmup"], convert_to_numpy=True, show_progress_bar=False)
+    
     def generate_embedding(self, text: str) -> List[float]:
         """
         Generate embedding for a single text string.
@@ -73,21 +231,93 @@ class EmbeddingService:
             return [0.0] * self.settings.EMBEDDING_DIMENSION
         
         try:
-            # Generate embedding
-            embedding = self.model.encode(
-                text,
-                convert_to_numpy=True,
-                normalize_embeddings=True  # Normalize for better similarity search
-            )
-            
-            # Convert numpy array to Python list
-            return embedding.tolist()
+            # Repeated queries (retries, suggestions) skip the forward pass
+            text = text.strip()
+            cached = EmbeddingService._cache_get(self.model_name, text)
+            if cached is None:
+                cached = self._encode_queries([text])[0]
+            return list(cached)
             
         except Exception as e:
             logger.error(f"Error generating embedding: {e}", exc_info=True)
             raise RuntimeError(f"Failed to generate embedding: {e}")
     
-    def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    def _encode_queries(self, texts: List[str]) -> List[Tuple[float, ...]]:
+        """
+        Embed query texts, reading the persistent cache first and encoding the
+        misses in one forward pass. Results are stored in both query caches.
+        """
+        rows: List[Optional[Tuple[float, ...]]] = [None] * len(texts)
+        missing = []
+        for idx, text in enumerate(texts):
+            stored = self.disk_cache.get(self.model_name, text) if self.disk_cache else None
+            if stored is None:
+                missing.append(idx)
+            else:
+                rows[idx] = tuple(stored.tolist())
+        
+        if missing:
+            with self._inference():
+                embeddings = self.model.encode(
+                    [texts[idx] for idx in missing],
+                    batch_size=len(missing),
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,  # Normalize for better similarity search
+                    show_progress_bar=False
+                )
+            embeddings = embeddings.astype(np.float32, copy=False)
+            for idx, embedding in zip(missing, embeddings):
+                # Immutable so cached vectors can't be modified by callers (float32 first, in case the model runs in fp16)
+                rows[idx] = tuple(embedding.tolist())
+                if self.disk_cache:
+                    self.disk_cache.set(self.model_name, texts[idx], embedding)
+        
+        for text, row in zip(texts, rows):
+            EmbeddingService._cache_put(self.model_name, text, row)
+        return rows
+    
+    @classmethod
+    def _cache_get(cls, model_name: str, text: str) -> Optional[Tuple[float, ...]]:
+        with cls._query_cache_lock:
+            value = cls._query_cache.get((model_name, text))
+            if value is None:
+                cls._query_cache_misses += 1
+            else:
+                cls._query_cache_hits += 1
+                cls._query_cache.move_to_end((model_name, text))
+            return value
+    
+    @classmethod
+    def _cache_put(cls, model_name: str, text: str, value: Tuple[float, ...]):
+        with cls._query_cache_lock:
+            cls._query_cache[(model_name, text)] = value
+            cls._query_cache.move_to_end((model_name, text))
+            while len(cls._query_cache) > _QUERY_CACHE_SIZE:
+                cls._query_cache.popitem(last=False)
+    
+    @classmethod
+    def _clear_query_cache(cls):
+        with cls._query_cache_lock:
+            cls._query_cache.clear()
+            cls._query_cache_hits = 0
+            cls._query_cache_misses = 0
+    
+    def get_query_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the in-memory query cache and, when enabled, the persistent one."""
+        cls = EmbeddingService
+        with cls._query_cache_lock:
+            hits, misses, size = cls._query_cache_hits, cls._query_cache_misses, len(cls._query_cache)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": size,
+            "max_size": _QUERY_CACHE_SIZE,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "disk": self.disk_cache.get_stats() if self.disk_cache else None
+        }
+    
+    def generate_embeddings_batch(self, texts: List[str]) -> np.ndarray:
         """
         Generate embeddings for a batch of text strings.
         
@@ -95,7 +325,7 @@ class EmbeddingService:
             texts: List of input text strings
             
         Returns:
-            List[List[float]]: List of embedding vectors
+            np.ndarray: float32 array of shape (n_texts, dimension), one row per embedding
             
         Raises:
             ValueError: If texts is empty or contains invalid entries
@@ -103,7 +333,7 @@ class EmbeddingService:
         """
         if not texts:
             logger.warning("Empty texts list provided")
-            return []
+            return self._empty_embeddings()
         
         if not isinstance(texts, list):
             raise ValueError("Texts must be a list of strings")
@@ -120,34 +350,37 @@ class EmbeddingService:
         
         if not valid_texts:
             logger.warning("No valid texts after filtering")
-            return []
+            return self._empty_embeddings()
         
         try:
-            # Generate embeddings in batches
+            # One encode call: sentence-transformers batches internally and sorts by length to cut padding
             batch_size = self.settings.EMBEDDING_BATCH_SIZE
-            all_embeddings = []
             
-            logger.info(f"Generating embeddings for {len(valid_texts)} texts in batches of {batch_size}")
+            # Repeated headers/footers/boilerplate are encoded once and scattered back
+            unique_index = {}
+            positions = [unique_index.setdefault(text, len(unique_index)) for text in valid_texts]
+            unique_texts = list(unique_index)
             
-            for i in range(0, len(valid_texts), batch_size):
-                batch = valid_texts[i:i + batch_size]
-                
-                # Generate embeddings for this batch
-                embeddings = self.model.encode(
-                    batch,
-                    batch_size=len(batch),
+            logger.debug(
+                f"Generating embeddings for {len(unique_texts)} unique of {len(valid_texts)} texts "
+                f"in batches of {batch_size}"
+            )
+            
+            with self._inference():
+                all_embeddings = self.model.encode(
+                    unique_texts,
+                    batch_size=batch_size,
                     convert_to_numpy=True,
+                    convert_to_tensor=False,
                     normalize_embeddings=True,  # Normalize for better similarity search
                     show_progress_bar=False
                 )
-                
-                # Convert numpy arrays to Python lists
-                batch_embeddings = [emb.tolist() for emb in embeddings]
-                all_embeddings.extend(batch_embeddings)
-                
-                logger.debug(f"Processed batch {i // batch_size + 1}, total embeddings: {len(all_embeddings)}")
             
-            logger.info(f"Successfully generated {len(all_embeddings)} embeddings")
+            all_embeddings = all_embeddings.astype(np.float32, copy=False)
+            if len(unique_texts) < len(valid_texts):
+                all_embeddings = all_embeddings[positions]
+            
+            logger.debug("Successfully generated %d embeddings", len(all_embeddings))
             
             # If some texts were filtered out, we need to return embeddings in original order
             # For now, we return only valid embeddings (can be enhanced later)
@@ -156,4 +389,126 @@ class EmbeddingService:
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {e}", exc_info=True)
             raise RuntimeError(f"Failed to generate batch embeddings: {e}")
-
+    
+    def _empty_embeddings(self) -> np.ndarray:
+        return np.empty((0, self.settings.EMBEDDING_DIMENSION), dtype=np.float32)
+    
+    def start_batcher(self):
+        """
+        Start the background task that fuses concurrent agenerate_embedding calls.
+        Must be called from a running event loop (app startup).
+        """
+        if self._batcher_task is not None and not self._batcher_task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._batcher_task = asyncio.create_task(self._batch_loop())
+        logger.info(f"Embedding batcher started (max_batch={self.max_batch}, max_wait={self.max_wait * 1000:.0f}ms)")
+    
+    async def stop_batcher(self):
+        """Cancel the batcher task and fail any queries still waiting on it."""
+        if self._batcher_task is None:
+            return
+        self._batcher_task.cancel()
+        try:
+            await self._batcher_task
+        except asyncio.CancelledError:
+            pass
+        self._batcher_task = None
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batcher stopped"))
+        self._queue = None
+    
+    async def _batch_loop(self):
+        """Collect queued queries for up to max_wait (or max_batch of them) and encode them in one call."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                rows = await loop.run_in_executor(None, self._encode_queries, texts)
+            except Exception as e:
+                logger.error(f"Error generating batched query embeddings: {e}", exc_info=True)
+                error = RuntimeError(f"Failed to generate embedding: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            
+            by_text = dict(zip(texts, rows))
+            for text, future in batch:
+                if not future.done():  # caller may have been cancelled
+                    future.set_result(list(by_text[text]))
+    
+    async def agenerate_embedding(self, text: str) -> List[float]:
+        """
+        Async counterpart of generate_embedding.
+        Cache misses are queued for the batcher so concurrent queries share one
+        encode call; without a running batcher, encoding runs in the default
+        thread pool so the event loop keeps serving other requests.
+        """
+        if self._batcher_task is None or self._batcher_task.done() or not isinstance(text, str) or not text.strip():
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.generate_embedding, text
+            )
+        
+        text = text.strip()
+        cached = EmbeddingService._cache_get(self.model_name, text)
+        if cached is not None:
+            return list(cached)
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+    
+    def generate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several queries, encoding all cache misses in a single forward pass.
+        
+        Args:
+            queries: Non-empty query strings
+            
+        Returns:
+            List[List[float]]: One embedding per query, in input order
+            
+        Raises:
+            ValueError: If a query is empty or invalid
+            RuntimeError: If model fails to generate embeddings
+        """
+        if any(not query or not isinstance(query, str) or not query.strip() for query in queries):
+            raise ValueError("Queries must be non-empty strings")
+        
+        texts = [query.strip() for query in queries]
+        try:
+            rows = {text: EmbeddingService._cache_get(self.model_name, text) for text in dict.fromkeys(texts)}
+            missing = [text for text, row in rows.items() if row is None]
+            if missing:
+                rows.update(zip(missing, self._encode_queries(missing)))
+            return [list(rows[text]) for text in texts]
+            
+        except Exception as e:
+            logger.error(f"Error generating query embeddings: {e}", exc_info=True)
+            raise RuntimeError(f"Failed to generate query embeddings: {e}")
+    
+    async def agenerate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Async wrapper around generate_query_embeddings (see agenerate_embedding)."""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.generate_query_embeddings, queries
+        )
+    
+    async def agenerate_embeddings_batch(self, texts: List[str]) -> np.ndarray:
+        """Async wrapper around generate_embeddings_batch (see agenerate_embedding)."""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.generate_embeddings_batch, texts
+        )
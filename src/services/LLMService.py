@@ -2,13 +2,65 @@
 LLM Service for OpenAI integration.
 Handles LLM API calls and prompt building for RAG.
 """
-from openai import OpenAI
-from typing import Optional, List, Dict
+from openai import AsyncOpenAI, RateLimitError, APIConnectionError, AuthenticationError, BadRequestError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+from typing import Optional, List, Dict, Union, AsyncIterator, Final
 from helpers import get_settings
+import asyncio
+import httpx
 import logging
 
+try:
+    import tiktoken
+except ImportError:  # fall back to the character heuristic in estimate_tokens
+    tiktoken = None
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_SYSTEM_MESSAGE: Final[str] = (
+    "You are a helpful assistant that answers questions based on the provided context. "
+    "Answer using only the information from the context. If the context doesn't contain "
+    "enough information, say so. Cite your sources when referencing specific information."
+)
+
+# Fixed text before the context blocks. Everything invariant comes first and the question
+# last, so repeated requests over the same chunks share a prefix the provider can cache.
+_RAG_INSTRUCTIONS: Final[str] = (
+    "Answer the question using only the information from the context below. "
+    "If the context doesn't contain enough information, say so. "
+    "Cite your sources when referencing specific information (e.g., 'According to Context 1...')."
+)
+_RAG_HEADER: Final[str] = (
+    "You are a helpful assistant that answers questions based on the provided context.\n"
+    + _RAG_INSTRUCTIONS
+    + "\n\nContext:\n"
+)
+_UNKNOWN_FILE: Final[str] = "unknown"
+
+# Chat formatting tokens added per message by the API
+_MESSAGE_OVERHEAD_TOKENS: Final[int] = 8
+
+_MAX_RETRY_WAIT = 30.0
+_backoff = wait_exponential_jitter(initial=1, max=_MAX_RETRY_WAIT)
+
+
+def _retry_after_or_backoff(retry_state) -> float:
+    """Honour the server's Retry-After header when present, else exponential backoff with jitter."""
+    response = getattr(retry_state.outcome.exception(), "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers.get("retry-after")), _MAX_RETRY_WAIT)
+        except (TypeError, ValueError):
+            pass
+    return _backoff(retry_state)
+
+
+def _is_transient(e: BaseException) -> bool:
+    """Rate limits and connection errors are worth retrying; exhausted quota is not."""
+    if isinstance(e, RateLimitError):
+        return getattr(e, "code", None) != "insufficient_quota"
+    return isinstance(e, APIConnectionError)
+
 
 class LLMService:
     """
@@ -17,6 +69,8 @@ class LLMService:
     """
     
     _client_instance = None
+    _http_client = None
+    _encoders = {}  # model name -> tiktoken encoding (None if unavailable)
     
     def __init__(self):
         """Initialize OpenAI client with API key from settings."""
@@ -26,6 +80,11 @@ class LLMService:
         self.temperature = self.settings.LLM_TEMPERATURE
         self.max_tokens = self.settings.LLM_MAX_TOKENS
         
+        # Caps in-flight completions so concurrent chats don't trip the account's rate limit
+        self._sem = asyncio.Semaphore(self.settings.LLM_MAX_CONCURRENCY)
+        # Tokens taken by the system message and fixed prompt text (computed on first use)
+        self._fixed_prompt_tokens: Optional[int] = None
+        
         # Initialize availability flag
         self._is_available = False
         self.client = None
@@ -39,7 +98,21 @@ class LLMService:
         if LLMService._client_instance is None:
             try:
                 logger.info(f"Initializing OpenAI client with model: {self.model}")
-                LLMService._client_instance = OpenAI(api_key=self.api_key)
+                # One keep-alive pool for every call, so only the first request pays the TCP/TLS handshake
+                LLMService._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.settings.LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=self.settings.LLM_MAX_KEEPALIVE
+                    ),
+                    timeout=httpx.Timeout(120.0),
+                    http2=True
+                )
+                # Retries are handled by _create_completion so the backoff and concurrency cap apply
+                LLMService._client_instance = AsyncOpenAI(
+                    api_key=self.api_key,
+                    max_retries=0,
+                    http_client=LLMService._http_client
+                )
                 logger.info("OpenAI client initialized successfully")
             except Exception as e:
                 logger.error(f"Error initializing OpenAI client: {e}", exc_info=True)
@@ -50,11 +123,28 @@ class LLMService:
         self.client = LLMService._client_instance
         self._is_available = True
     
+    @classmethod
+    async def aclose(cls):
+        """Close the shared HTTP connection pool (app shutdown)."""
+        if cls._http_client is not None:
+            await cls._http_client.aclose()
+            cls._http_client = None
+            cls._client_instance = None
+    
+    async def warmup(self):
+        """
+        Open a pooled connection to the API before the first user request.
+        Looks up the configured model, which costs no tokens and also validates the key.
+        """
+        if not self.is_available():
+            return
+        await self.client.models.retrieve(self.model)
+    
     def is_available(self) -> bool:
         """Check if LLM service is available (API key configured)."""
         return self._is_available and self.client is not None
     
-    def generate_response(
+    async def agenerate_response(
         self,
         prompt: str,
         system_message: Optional[str] = None
@@ -81,46 +171,126 @@ class LLMService:
         
         # Default system message for RAG
         if system_message is None:
-            system_message = (
-                "You are a helpful assistant that answers questions based on the provided context. "
-                "Answer using only the information from the context. If the context doesn't contain "
-                "enough information, say so. Cite your sources when referencing specific information."
-            )
+            system_message = DEFAULT_SYSTEM_MESSAGE
         
         try:
-            logger.info(f"Generating response with model: {self.model}")
-            logger.debug(f"Prompt length: {len(prompt)} characters")
+            logger.debug("Generating response with model %s (prompt: %d characters)", self.model, len(prompt))
             
             messages = [
                 {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
             ]
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
+            response = await self._create_completion(messages)
             
             answer = response.choices[0].message.content.strip()
-            logger.info(f"Generated response: {len(answer)} characters")
+            logger.debug("Generated response: %d characters", len(answer))
             
             return answer
             
         except Exception as e:
-            error_msg = str(e)
-            logger.error(f"Error generating LLM response: {error_msg}", exc_info=True)
+            logger.error(f"Error generating LLM response: {e}", exc_info=True)
+            raise self._translate_error(e) from e
+    
+    async def astream_response(
+        self,
+        prompt: str,
+        system_message: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream an LLM response as text deltas while it is being generated.
+        
+        Args:
+            prompt: User prompt/question
+            system_message: Optional system message to set behavior
             
-            # Handle specific OpenAI errors
-            if "rate_limit" in error_msg.lower() or "429" in error_msg:
-                raise RuntimeError("OpenAI API rate limit exceeded. Please try again later.")
-            elif "invalid_api_key" in error_msg.lower() or "401" in error_msg:
-                raise RuntimeError("Invalid OpenAI API key. Please check your configuration.")
-            elif "insufficient_quota" in error_msg.lower():
-                raise RuntimeError("OpenAI API quota exceeded. Please check your account.")
-            else:
-                raise RuntimeError(f"Failed to generate LLM response: {error_msg}")
+        Yields:
+            str: Response text fragments in order
+            
+        Raises:
+            ValueError: If prompt is empty
+            RuntimeError: If API call fails
+        """
+        if not self.is_available():
+            raise ValueError("OpenAI API key is not configured. Please set OPENAI_API_KEY in your .env file.")
+        
+        if not prompt or not prompt.strip():
+            raise ValueError("Prompt cannot be empty")
+        
+        messages = [
+            {"role": "system", "content": system_message or DEFAULT_SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ]
+        
+        try:
+            # The concurrency slot is held until the stream is drained
+            async with self._sem:
+                stream = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True
+                )
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+        except Exception as e:
+            logger.error(f"Error streaming LLM response: {e}", exc_info=True)
+            raise self._translate_error(e) from e
+    
+    @staticmethod
+    def _translate_error(e: Exception) -> RuntimeError:
+        """Map an OpenAI failure to the RuntimeError message shown to API clients."""
+        if isinstance(e, RateLimitError):
+            # Exhausted credit is reported as a 429 with its own error code
+            if getattr(e, "code", None) == "insufficient_quota":
+                return RuntimeError("OpenAI API quota exceeded. Please check your account.")
+            return RuntimeError("OpenAI API rate limit exceeded. Please try again later.")
+        if isinstance(e, AuthenticationError):
+            return RuntimeError("Invalid OpenAI API key. Please check your configuration.")
+        if isinstance(e, APIConnectionError):
+            return RuntimeError("Could not reach the OpenAI API. Please try again later.")
+        if isinstance(e, BadRequestError):
+            return RuntimeError(f"OpenAI rejected the request: {e}")
+        return RuntimeError(f"Failed to generate LLM response: {e}")
+    
+    @retry(
+        wait=_retry_after_or_backoff,
+        stop=stop_after_attempt(5),
+        retry=retry_if_exception(_is_transient),
+        reraise=True
+    )
+    async def _create_completion(self, messages: List[Dict[str, str]]):
+        """Chat completion call, limited by the concurrency semaphore and retried on rate limits/connection errors."""
+        async with self._sem:
+            return await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            )
+    
+    async def agenerate_many(
+        self,
+        prompts: List[str],
+        system_message: Optional[str] = None
+    ) -> List[Union[str, Exception]]:
+        """
+        Generate responses for several prompts concurrently.
+        
+        Args:
+            prompts: List of prompts
+            system_message: Optional system message shared by all prompts
+            
+        Returns:
+            List: One entry per prompt, either the response text or the exception it raised
+        """
+        return await asyncio.gather(
+            *(self.agenerate_response(prompt, system_message) for prompt in prompts),
+            return_exceptions=True
+        )
     
     def build_rag_prompt(
         self,
@@ -130,6 +300,8 @@ class LLMService:
     ) -> str:
         """
         Build RAG prompt with query and context chunks.
+        Chunks are added in order until the context window (minus the response
+        budget and the fixed parts of the prompt) is used up.
         
         Args:
             query: User's question/query
@@ -142,44 +314,76 @@ class LLMService:
         if not context_chunks:
             return f"Question: {query}\n\nI don't have any relevant context to answer this question."
         
-        prompt_parts = ["You are a helpful assistant that answers questions based on the provided context.\n"]
-        prompt_parts.append("\nContext:\n")
+        question = f"\nQuestion: {query}\n"
+        
+        if self._fixed_prompt_tokens is None:
+            self._fixed_prompt_tokens = (
+                self.estimate_tokens(DEFAULT_SYSTEM_MESSAGE)
+                + self.estimate_tokens(_RAG_HEADER)
+                + 2 * _MESSAGE_OVERHEAD_TOKENS
+            )
+        token_budget = (
+            self.settings.LLM_CONTEXT_WINDOW
+            - self.max_tokens
+            - self._fixed_prompt_tokens
+            - self.estimate_tokens(question)
+        )
+        
+        prompt_parts = [_RAG_HEADER]
         
         for idx, (chunk_text, source) in enumerate(zip(context_chunks, sources), start=1):
-            file_id = source.get("file_id", "unknown")
-            chunk_order = source.get("chunk_order", 0)
-            similarity = source.get("distance")
+            # One interpolation per chunk; the similarity suffix only when a distance is known
+            distance = source.get("distance")
+            similarity = "" if distance is None else f" (similarity: {1 - distance:.2f})"
+            block = (
+                f"\n[Context {idx}]\n{chunk_text}\n"
+                f"Source: {source.get('file_id', _UNKNOWN_FILE)}, chunk {source.get('chunk_order', 0)}{similarity}\n"
+            )
             
-            prompt_parts.append(f"\n[Context {idx}]\n{chunk_text}\n")
-            prompt_parts.append(f"Source: {file_id}, chunk {chunk_order}")
-            if similarity is not None:
-                prompt_parts.append(f" (similarity: {1 - similarity:.2f})")
-            prompt_parts.append("\n")
-        
-        prompt_parts.append(f"\nQuestion: {query}\n\n")
-        prompt_parts.append(
-            "Answer the question using only the information from the context above. "
-            "If the context doesn't contain enough information, say so. "
-            "Cite your sources when referencing specific information (e.g., 'According to Context 1...')."
-        )
+            block_tokens = self.estimate_tokens(block)
+            if block_tokens > token_budget:
+                logger.warning("Context window full, dropping %d of %d chunks", len(context_chunks) - idx + 1, len(context_chunks))
+                break
+            token_budget -= block_tokens
+            prompt_parts.append(block)
+        
+        prompt_parts.append(question)
         
         return "".join(prompt_parts)
     
+    def _get_encoder(self):
+        """tiktoken encoding for the configured model (cached per model), or None if unavailable."""
+        if tiktoken is None:
+            return None
+        if self.model not in LLMService._encoders:
+            try:
+                encoder = tiktoken.encoding_for_model(self.model)
+            except KeyError:
+                # Unknown model name: use the encoding of current OpenAI chat models
+                encoder = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"Could not load tiktoken encoding for {self.model}: {e}")
+                encoder = None
+            LLMService._encoders[self.model] = encoder
+        return LLMService._encoders[self.model]
+    
     def estimate_tokens(self, text: str) -> int:
         """
-        Estimate token count for a text string.
-        Rough estimation: ~4 characters per token for English text.
+        Count tokens in a text string with the model's tiktoken encoding.
+        Falls back to ~4 characters per token if tiktoken is unavailable.
         
         Args:
             text: Input text
             
         Returns:
-            int: Estimated token count
+            int: Token count
         """
         if not text:
             return 0
         
-        # Rough estimation: 1 token ≈ 4 characters for English
-        # This is a simple heuristic, actual tokenization varies
-        return len(text) // 4
-
+        encoder = self._get_encoder()
+        if encoder is None:
+            # Rough estimation: 1 token ≈ 4 characters for English
+            return len(text) // 4
+        
+        return len(encoder.encode(text, disallowed_special=()))
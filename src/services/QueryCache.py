@@ -0,0 +1,69 @@
+"""
+In-memory LRU + TTL cache for vector search results.
+Entries are invalidated per project when its chunks change.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import threading
+import time
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with per-entry expiry.
+    Keys are tuples whose first element is the project_id.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        """
+        Args:
+            max_size: Maximum number of cached results
+            ttl_seconds: Lifetime of a cached result
+        """
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_project(self, project_id: str):
+        """Drop every cached result of a project."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == project_id]:
+                del self._entries[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,86 @@
+"""
+Persistent cache of query embeddings.
+Survives restarts so recurring queries skip the model entirely.
+"""
+from diskcache import Cache
+from typing import Optional, Dict, Any
+import numpy as np
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """
+    Content-addressed on-disk store of query embeddings.
+    Keys are blake2b digests of (model_name, text); values are raw float32 bytes.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: int, dimension: int):
+        """
+        Open (or create) the cache directory.
+
+        Args:
+            directory: Directory holding the cache database
+            ttl_seconds: Expiry for stored vectors (0 keeps them forever)
+            dimension: Embedding dimension, used to reject stale entries
+        """
+        self.ttl = ttl_seconds or None
+        self.dimension = dimension
+        self._cache = Cache(directory)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.blake2b(f"{model_name}:{text}".encode("utf-8"), digest_size=20).hexdigest()
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """
+        Look up a stored embedding.
+
+        Returns:
+            np.ndarray: float32 vector, or None on a miss
+        """
+        raw = self._cache.get(self.make_key(model_name, text))
+        vector = None
+        if raw is not None:
+            vector = np.frombuffer(raw, dtype=np.float32)
+            if vector.shape[0] != self.dimension:
+                vector = None
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return vector
+
+    def set(self, model_name: str, text: str, vector: np.ndarray):
+        """Store an embedding as float32 bytes."""
+        try:
+            self._cache.set(
+                self.make_key(model_name, text),
+                np.asarray(vector, dtype=np.float32).tobytes(),
+                expire=self.ttl
+            )
+        except Exception as e:
+            # A full or locked disk must not fail the query
+            logger.warning(f"Could not persist query embedding: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and entry count."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": len(self._cache),
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        self._cache.close()
@@ -2,25 +2,46 @@
 RAG Service for orchestrating the complete RAG pipeline.
 Combines vector search with LLM to generate context-aware responses.
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from collections import OrderedDict
+from itertools import compress
 from helpers import get_settings
 from services import EmbeddingService, VectorDBService, LLMService
+import numpy as np
+import asyncio
+import hashlib
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
+def _truncate(text: str, n: int = 200) -> str:
+    """Shorten text to n characters for citations, marking the cut with an ellipsis."""
+    return text if len(text) <= n else text[:n] + "..."
+
+
 class RAGService:
     """
     Service for orchestrating the RAG (Retrieval-Augmented Generation) pipeline.
     Combines vector similarity search with LLM to generate intelligent responses.
     """
     
-    def __init__(self):
-        """Initialize all required services for RAG pipeline."""
+    def __init__(
+        self,
+        embedding_service: Optional[EmbeddingService] = None,
+        vector_db_service: Optional[VectorDBService] = None
+    ):
+        """
+        Initialize all required services for RAG pipeline.
+        
+        Args:
+            embedding_service: Shared EmbeddingService to reuse (created if omitted)
+            vector_db_service: Shared VectorDBService to reuse (created if omitted)
+        """
         self.settings = get_settings()
-        self.embedding_service = EmbeddingService()
-        self.vector_db_service = VectorDBService()
+        self.embedding_service = embedding_service or EmbeddingService()
+        self.vector_db_service = vector_db_service or VectorDBService()
         
         # Initialize LLM service (may not be available if API key missing)
         try:
@@ -29,21 +50,42 @@ class RAGService:
             if not self.llm_available:
                 logger.warning("LLM service is not available - chat will return search results only")
         except Exception as e:
-            logger.warning(f"LLM service initialization failed: {e} - chat will return search results only")
+            logger.warning("LLM service initialization failed: %s - chat will return search results only", e)
             self.llm_service = None
             self.llm_available = False
         
         self.context_chunks = self.settings.RAG_CONTEXT_CHUNKS
         self.similarity_threshold = self.settings.RAG_SIMILARITY_THRESHOLD
+        self.answer_cache_enabled = self.settings.RAG_ANSWER_CACHE_ENABLED
+        
+        # key -> (expires_at, (prompt, sources, chunks_retrieved)), least recently used first
+        self._prompt_cache: "OrderedDict[str, Tuple[float, Tuple[str, List[Dict[str, Any]], int]]]" = OrderedDict()
         
-        logger.info(f"RAGService initialized (LLM available: {self.llm_available})")
+        logger.info("RAGService initialized (LLM available: %s)", self.llm_available)
     
-    def retrieve_context(
+    async def warmup(self, timeout: float = 10.0):
+        """
+        Open the OpenAI connection pool (app startup); the embedding model is warmed
+        by EmbeddingService.warmup. Failures are logged and ignored; the first request
+        then simply pays the cold start.
+        """
+        if not self.llm_available or self.llm_service is None:
+            return
+        
+        try:
+            await asyncio.wait_for(self.llm_service.warmup(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("RAG warmup did not finish within %ss", timeout)
+        except Exception as e:
+            logger.warning("RAG warmup step failed: %s", e)
+    
+    async def retrieve_context(
         self,
         project_id: str,
         query: str,
         top_k: Optional[int] = None,
-        file_id: Optional[str] = None
+        file_id: Optional[str] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Retrieve relevant context chunks for a query.
@@ -53,6 +95,7 @@ class RAGService:
             query: User query/question
             top_k: Number of chunks to retrieve (overrides default)
             file_id: Optional file filter
+            query_embedding: Precomputed query embedding (computed if omitted)
             
         Returns:
             List[Dict]: List of relevant chunks with metadata
@@ -63,69 +106,149 @@ class RAGService:
         
         try:
             # Generate query embedding
-            logger.info(f"Generating embedding for query: '{query[:50]}...'")
-            query_embedding = self.embedding_service.generate_embedding(query.strip())
+            if query_embedding is None:
+                logger.info("Generating embedding for query: '%.50s...'", query)
+                query_embedding = await self.embedding_service.agenerate_embedding(query.strip())
             
             # Determine top_k
             search_top_k = top_k if top_k is not None else self.context_chunks
             
             # Search for similar chunks
-            logger.info(f"Searching for {search_top_k} similar chunks in project {project_id}")
-            results = self.vector_db_service.search_similar(
-                project_id=project_id,
-                query_embedding=query_embedding,
-                top_k=search_top_k,
-                file_id=file_id
-            )
-            logger.info(f"VectorDB returned {len(results)} results before filtering")
+            logger.info("Searching for %d similar chunks in project %s", search_top_k, project_id)
+            # Chroma calls block, keep them off the event loop
+            results = None
+            coarse_search = {
+                "f16": self.vector_db_service.search_similar_f16,
+                "i8": self.vector_db_service.search_similar_quantized,
+                "binary": self.vector_db_service.search_similar_binary,
+            }.get(self.vector_db_service.storage_dtype)
+            if coarse_search is not None:
+                results = await asyncio.to_thread(
+                    coarse_search,
+                    project_id=project_id,
+                    query_embedding=query_embedding,
+                    top_k=search_top_k,
+                    file_id=file_id
+                )
+            if not results:
+                # Also covers projects indexed before the quantized copies were enabled
+                results = await asyncio.to_thread(
+                    self.vector_db_service.search_similar,
+                    project_id=project_id,
+                    query_embedding=query_embedding,
+                    top_k=search_top_k,
+                    file_id=file_id
+                )
+            logger.info("VectorDB returned %d results before filtering", len(results))
             
-            # Filter by similarity threshold if configured (threshold > 0)
-            # Note: ChromaDB uses cosine distance (0-2 range, lower is better)
-            # For cosine distance: similarity ≈ 1 - distance (but distance can be > 1)
-            if self.similarity_threshold > 0 and results:
-                filtered_results = []
-                for result in results:
-                    distance = result.get("distance")
-                    if distance is None:
-                        logger.warning(f"Distance is None for chunk {result.get('chunk_id', 'unknown')}, defaulting to 1.0")
-                        distance = 1.0
-                    # For cosine distance: convert to similarity score
-                    # Distance 0 = perfect match (similarity 1.0)
-                    # Distance 1 = orthogonal (similarity 0.0)
-                    # Distance 2 = opposite (similarity -1.0)
-                    similarity = max(0.0, min(1.0, 1.0 - distance))  # Clamp to 0-1 range
-                    
-                    if similarity >= self.similarity_threshold:
-                        result["similarity"] = similarity
-                        result["distance"] = distance  # Keep original distance
-                        filtered_results.append(result)
-                    else:
-                        logger.debug(f"Filtered out chunk with similarity {similarity:.3f} (threshold: {self.similarity_threshold}, distance: {distance:.3f})")
+            # ChromaDB uses cosine distance: 0 = identical, 1 = orthogonal, 2 = opposite.
+            # Convert to similarity = 1 - distance (clamped to 0-1) for all results in one pass;
+            # a missing distance is treated as 1.0 (similarity 0).
+            if results:
+                distances = np.fromiter(
+                    (1.0 if result.get("distance") is None else result["distance"] for result in results),
+                    dtype=np.float64,
+                    count=len(results)
+                )
+                similarities = np.clip(1.0 - distances, 0.0, 1.0)
                 
-                results = filtered_results
-                logger.info(f"Filtered to {len(results)} chunks above similarity threshold {self.similarity_threshold}")
-            else:
-                # No threshold filtering - add similarity scores for all results
-                for result in results:
-                    distance = result.get("distance")
-                    if distance is None:
-                        logger.warning(f"Distance is None for chunk {result.get('chunk_id', 'unknown')}, defaulting to 1.0")
-                        distance = 1.0
-                    # ChromaDB uses cosine distance: 0 = identical, 1 = orthogonal, 2 = opposite
-                    # Convert to similarity: similarity = 1 - distance (clamped to 0-1)
-                    similarity = max(0.0, min(1.0, 1.0 - distance))
-                    result["similarity"] = similarity
-                    result["distance"] = distance  # Keep original distance for debugging
-                    logger.debug(f"Chunk similarity: {similarity:.3f} (distance: {distance:.3f})")
-                logger.info(f"Using all {len(results)} retrieved chunks (no similarity threshold)")
+                # Convert once to Python floats and annotate lazily; compress() drops rows in C
+                annotated = (
+                    dict(result, similarity=similarity, distance=distance)
+                    for result, similarity, distance in zip(results, similarities.tolist(), distances.tolist())
+                )
+                
+                # Filter by similarity threshold if configured (threshold > 0)
+                if self.similarity_threshold > 0:
+                    total = len(results)
+                    results = list(compress(annotated, (similarities >= self.similarity_threshold).tolist()))
+                    logger.info(
+                        "Filtered to %d of %d chunks above similarity threshold %s",
+                        len(results), total, self.similarity_threshold
+                    )
+                else:
+                    results = list(annotated)
             
-            logger.info(f"Retrieved {len(results)} relevant chunks")
+            logger.info("Retrieved %d relevant chunks", len(results))
             return results
             
         except Exception as e:
-            logger.error(f"Error retrieving context: {e}", exc_info=True)
+            logger.error("Error retrieving context: %s", e, exc_info=True)
             raise RuntimeError(f"Failed to retrieve context: {str(e)}")
     
+    async def aretrieve_context_batch(
+        self,
+        project_id: str,
+        queries: List[str],
+        top_k: Optional[int] = None,
+        file_id: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve context for several queries (multi-query rewriting, HyDE, evaluation).
+        All queries are embedded in one call and the vector searches run concurrently.
+        
+        Args:
+            project_id: Project identifier
+            queries: User queries/questions
+            top_k: Number of chunks to retrieve per query (overrides default)
+            file_id: Optional file filter
+            
+        Returns:
+            List[List[Dict]]: Relevant chunks for each query, in input order
+        """
+        if not queries:
+            return []
+        
+        embeddings = await self.embedding_service.agenerate_query_embeddings(queries)
+        return await asyncio.gather(*(
+            self.retrieve_context(
+                project_id=project_id,
+                query=query,
+                top_k=top_k,
+                file_id=file_id,
+                query_embedding=embedding
+            )
+            for query, embedding in zip(queries, embeddings)
+        ))
+    
+    def _prompt_cache_key(self, project_id: str, query: str, file_id: Optional[str], top_k: int) -> str:
+        """Key of a built prompt; the project's index version invalidates it when documents change."""
+        index_version = self.vector_db_service.get_index_version(project_id)
+        raw = f"{project_id}|{file_id or ''}|{top_k}|{index_version}|{query.strip()}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=20).hexdigest()
+    
+    def _get_cached_prompt(self, key: str) -> Optional[Tuple[str, List[Dict[str, Any]], int]]:
+        entry = self._prompt_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at < time.monotonic():
+            del self._prompt_cache[key]
+            return None
+        self._prompt_cache.move_to_end(key)
+        return payload
+    
+    def _put_cached_prompt(self, key: str, payload: Tuple[str, List[Dict[str, Any]], int]):
+        self._prompt_cache[key] = (time.monotonic() + self.settings.RAG_PROMPT_CACHE_TTL, payload)
+        self._prompt_cache.move_to_end(key)
+        while len(self._prompt_cache) > self.settings.RAG_PROMPT_CACHE_SIZE:
+            self._prompt_cache.popitem(last=False)
+    
+    def _order_for_prompt(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        With RAG_STABLE_CONTEXT_ORDER, order chunks by (file_id, chunk_order) instead of
+        similarity so the same chunk set always yields a byte-identical context block.
+        """
+        if not self.settings.RAG_STABLE_CONTEXT_ORDER:
+            return chunks
+        return sorted(
+            chunks,
+            key=lambda chunk: (
+                (chunk.get("metadata") or {}).get("file_id", ""),
+                int((chunk.get("metadata") or {}).get("chunk_order", 0))
+            )
+        )
+    
     def format_sources(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Format chunk metadata as source citations.
@@ -138,19 +261,24 @@ class RAGService:
         """
         sources = []
         for idx, chunk in enumerate(chunks, start=1):
-            metadata = chunk.get("metadata", {})
-            source = {
+            metadata = chunk.get("metadata") or {}
+            
+            similarity = chunk.get("similarity")
+            if similarity is None:
+                distance = chunk.get("distance")
+                similarity = 0.0 if distance is None else max(0.0, 1.0 - distance)
+            
+            sources.append({
                 "source_index": idx,
                 "file_id": metadata.get("file_id", "unknown"),
                 "chunk_order": metadata.get("chunk_order", 0),
-                "chunk_text": chunk.get("chunk_text", "")[:200] + "..." if len(chunk.get("chunk_text", "")) > 200 else chunk.get("chunk_text", ""),
-                "similarity": chunk.get("similarity", 0.0) if "similarity" in chunk else (max(0.0, 1.0 - chunk.get("distance", 1.0)) if chunk.get("distance") is not None else 0.0)
-            }
-            sources.append(source)
+                "chunk_text": _truncate(chunk.get("chunk_text") or ""),
+                "similarity": similarity
+            })
         
         return sources
     
-    def generate_answer(
+    async def generate_answer(
         self,
         project_id: str,
         query: str,
@@ -176,60 +304,94 @@ class RAGService:
             raise ValueError("Query cannot be empty")
         
         try:
-            # Step 1: Retrieve relevant context
-            logger.info(f"Starting RAG pipeline for query: '{query[:50]}...'")
-            chunks = self.retrieve_context(
-                project_id=project_id,
-                query=query,
-                top_k=top_k,
-                file_id=file_id
+            # Step 1: Embed the query once; it keys the answer cache and drives retrieval.
+            # The project collection is opened (or created) concurrently so the search doesn't wait on it.
+            logger.info("Starting RAG pipeline for query: '%.50s...'", query)
+            query_embedding, _ = await asyncio.gather(
+                self.embedding_service.agenerate_embedding(query.strip()),
+                asyncio.to_thread(self.vector_db_service.get_or_create_collection, project_id)
             )
+            search_top_k = top_k if top_k is not None else self.context_chunks
             
-            if not chunks:
-                logger.warning(f"No relevant chunks found for query: '{query}'")
-                logger.warning("This might be due to:")
-                logger.warning("1. No documents processed for this project")
-                logger.warning("2. Similarity threshold too high (if enabled)")
-                logger.warning("3. Query embedding mismatch with document embeddings")
-                return {
-                    "answer": "I couldn't find any relevant information in the documents to answer your question. Please try rephrasing your query or ensure documents have been processed.",
-                    "sources": [],
-                    "query": query,
-                    "chunks_retrieved": 0,
-                    "debug_info": "No chunks retrieved. Check if documents were processed and embeddings were stored."
-                }
-            
-            # Step 2: Format sources
-            sources = self.format_sources(chunks)
-            
-            # Step 3: Extract chunk texts for prompt
-            context_texts = [chunk.get("chunk_text", "") for chunk in chunks]
-            
-            # Step 4: Check if LLM is available before building prompt
-            if not self.llm_available or self.llm_service is None:
-                logger.warning("LLM not available - returning search results only")
-                return {
-                    "answer": None,
-                    "search_results": sources,
-                    "query": query,
-                    "chunks_retrieved": len(chunks),
-                    "error": "OpenAI API key is not configured. Please set OPENAI_API_KEY in your .env file to enable AI chat responses."
-                }
+            # Step 2: Reuse the answer to a semantically equivalent earlier question
+            if self.answer_cache_enabled and self.llm_available:
+                cached = await asyncio.to_thread(
+                    self.vector_db_service.get_cached_answer,
+                    project_id=project_id,
+                    query_embedding=query_embedding,
+                    file_id=file_id,
+                    top_k=search_top_k,
+                    min_similarity=self.settings.RAG_ANSWER_CACHE_SIMILARITY,
+                    ttl_seconds=self.settings.RAG_ANSWER_CACHE_TTL
+                )
+                if cached is not None:
+                    logger.info("Answer cache hit")
+                    return {**cached, "query": query, "cached": True}
             
-            # Step 5: Build RAG prompt
-            logger.info("Building RAG prompt with context")
-            prompt = self.llm_service.build_rag_prompt(
-                query=query,
-                context_chunks=context_texts,
-                sources=sources
-            )
+            # Step 3: Reuse the prompt built for an identical request while the index is unchanged
+            prompt_key = self._prompt_cache_key(project_id, query, file_id, search_top_k)
+            cached_prompt = self._get_cached_prompt(prompt_key) if self.llm_available else None
+            if cached_prompt is not None:
+                prompt, sources, chunks_retrieved = cached_prompt
+            else:
+                # Step 4: Retrieve relevant context
+                chunks = await self.retrieve_context(
+                    project_id=project_id,
+                    query=query,
+                    top_k=search_top_k,
+                    file_id=file_id,
+                    query_embedding=query_embedding
+                )
+                
+                if not chunks:
+                    logger.warning("No relevant chunks found for query: '%s'", query)
+                    logger.warning("This might be due to:")
+                    logger.warning("1. No documents processed for this project")
+                    logger.warning("2. Similarity threshold too high (if enabled)")
+                    logger.warning("3. Query embedding mismatch with document embeddings")
+                    return {
+                        "answer": "I couldn't find any relevant information in the documents to answer your question. Please try rephrasing your query or ensure documents have been processed.",
+                        "sources": [],
+                        "query": query,
+                        "chunks_retrieved": 0,
+                        "debug_info": "No chunks retrieved. Check if documents were processed and embeddings were stored."
+                    }
+                
+                # Step 5: Format sources
+                chunks = self._order_for_prompt(chunks)
+                sources = self.format_sources(chunks)
+                
+                # Step 6: Extract chunk texts for prompt
+                context_texts = [chunk.get("chunk_text", "") for chunk in chunks]
+                
+                # Step 7: Check if LLM is available before building prompt
+                if not self.llm_available or self.llm_service is None:
+                    logger.warning("LLM not available - returning search results only")
+                    return {
+                        "answer": None,
+                        "search_results": sources,
+                        "query": query,
+                        "chunks_retrieved": len(chunks),
+                        "error": "OpenAI API key is not configured. Please set OPENAI_API_KEY in your .env file to enable AI chat responses."
+                    }
+                
+                # Step 8: Build RAG prompt
+                logger.info("Building RAG prompt with context")
+                prompt = self.llm_service.build_rag_prompt(
+                    query=query,
+                    context_chunks=context_texts,
+                    sources=sources
+                )
+                
+                chunks_retrieved = len(chunks)
+                self._put_cached_prompt(prompt_key, (prompt, sources, chunks_retrieved))
             
-            # Step 6: Generate answer using LLM
+            # Step 9: Generate answer using LLM
             logger.info("Generating answer using LLM")
             try:
-                answer = self.llm_service.generate_response(prompt)
+                answer = await self.llm_service.agenerate_response(prompt)
             except Exception as e:
-                logger.error(f"LLM generation failed: {e}", exc_info=True)
+                logger.error("LLM generation failed: %s", e, exc_info=True)
                 # Graceful degradation: return search results without LLM answer
                 logger.warning("Falling back to search results only (LLM unavailable)")
                 return {
@@ -237,22 +399,132 @@ class RAGService:
                     "search_results": sources,
                     "sources": sources,  # Include sources in both fields for consistency
                     "query": query,
-                    "chunks_retrieved": len(chunks),
+                    "chunks_retrieved": chunks_retrieved,
                     "error": f"LLM generation failed: {str(e)}",
                     "warning": "LLM generation failed, returning search results only"
                 }
             
             logger.info("RAG pipeline completed successfully")
             
-            return {
+            result = {
                 "answer": answer,
                 "sources": sources,
                 "search_results": sources,  # Include for consistency
                 "query": query,
-                "chunks_retrieved": len(chunks)
+                "chunks_retrieved": chunks_retrieved
             }
             
+            if self.answer_cache_enabled:
+                await asyncio.to_thread(
+                    self.vector_db_service.cache_answer,
+                    project_id=project_id,
+                    query_embedding=query_embedding,
+                    file_id=file_id,
+                    top_k=search_top_k,
+                    payload=result,
+                    max_entries=self.settings.RAG_ANSWER_CACHE_MAX_ENTRIES
+                )
+            
+            return result
+            
         except Exception as e:
-            logger.error(f"Error in RAG pipeline: {e}", exc_info=True)
+            logger.error("Error in RAG pipeline: %s", e, exc_info=True)
             raise RuntimeError(f"RAG pipeline failed: {str(e)}")
-
+    
+    async def astream_answer(
+        self,
+        project_id: str,
+        query: str,
+        file_id: Optional[str] = None,
+        top_k: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of generate_answer: retrieves context, then yields the
+        LLM answer as it is generated. Cached answers are yielded in one piece.
+        
+        Args:
+            project_id: Project identifier
+            query: User query/question
+            file_id: Optional file filter
+            top_k: Optional override for number of context chunks
+            
+        Yields:
+            str: Answer text fragments in order
+            
+        Raises:
+            ValueError: If query is empty or the LLM is not configured
+            RuntimeError: If retrieval or generation fails
+        """
+        if not query or not query.strip():
+            raise ValueError("Query cannot be empty")
+        
+        if not self.llm_available or self.llm_service is None:
+            raise ValueError("OpenAI API key is not configured. Please set OPENAI_API_KEY in your .env file to enable AI chat responses.")
+        
+        query_embedding, _ = await asyncio.gather(
+            self.embedding_service.agenerate_embedding(query.strip()),
+            asyncio.to_thread(self.vector_db_service.get_or_create_collection, project_id)
+        )
+        search_top_k = top_k if top_k is not None else self.context_chunks
+        
+        if self.answer_cache_enabled:
+            cached = await asyncio.to_thread(
+                self.vector_db_service.get_cached_answer,
+                project_id=project_id,
+                query_embedding=query_embedding,
+                file_id=file_id,
+                top_k=search_top_k,
+                min_similarity=self.settings.RAG_ANSWER_CACHE_SIMILARITY,
+                ttl_seconds=self.settings.RAG_ANSWER_CACHE_TTL
+            )
+            if cached is not None:
+                yield cached["answer"]
+                return
+        
+        prompt_key = self._prompt_cache_key(project_id, query, file_id, search_top_k)
+        cached_prompt = self._get_cached_prompt(prompt_key)
+        if cached_prompt is not None:
+            prompt, sources, chunks_retrieved = cached_prompt
+        else:
+            chunks = await self.retrieve_context(
+                project_id=project_id,
+                query=query,
+                top_k=search_top_k,
+                file_id=file_id,
+                query_embedding=query_embedding
+            )
+            if not chunks:
+                yield "I couldn't find any relevant information in the documents to answer your question. Please try rephrasing your query or ensure documents have been processed."
+                return
+            
+            chunks = self._order_for_prompt(chunks)
+            sources = self.format_sources(chunks)
+            prompt = self.llm_service.build_rag_prompt(
+                query=query,
+                context_chunks=[chunk.get("chunk_text", "") for chunk in chunks],
+                sources=sources
+            )
+            chunks_retrieved = len(chunks)
+            self._put_cached_prompt(prompt_key, (prompt, sources, chunks_retrieved))
+        
+        answer_parts = []
+        async for delta in self.llm_service.astream_response(prompt):
+            answer_parts.append(delta)
+            yield delta
+        
+        if self.answer_cache_enabled:
+            await asyncio.to_thread(
+                self.vector_db_service.cache_answer,
+                project_id=project_id,
+                query_embedding=query_embedding,
+                file_id=file_id,
+                top_k=search_top_k,
+                payload={
+                    "answer": "".join(answer_parts).strip(),
+                    "sources": sources,
+                    "search_results": sources,
+                    "query": query,
+                    "chunks_retrieved": chunks_retrieved
+                },
+                max_entries=self.settings.RAG_ANSWER_CACHE_MAX_ENTRIES
+            )
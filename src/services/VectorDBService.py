@@ -4,13 +4,56 @@ Handles storing embeddings and performing similarity search.
 """
 import chromadb
 from chromadb.config import Settings as ChromaSettings
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from helpers import get_settings
+from .QueryCache import QueryCache
+from bson.objectid import ObjectId
+from uuid import UUID
+import numpy as np
+import base64
+import hashlib
 import logging
+import orjson
 import os
+import time
 
 logger = logging.getLogger(__name__)
 
+# Candidates kept by the int8/binary scans per requested result, before exact rescoring
+_QUANTIZED_OVERSAMPLE = 4
+# Minimum age of a cached answer's last_used before a hit rewrites it
+_ANSWER_LRU_REFRESH_SECONDS = 60
+# Metadata written for the coarse first-stage scans; never returned to callers
+_SHADOW_METADATA_KEYS = ("embedding_f16", "embedding_i8", "embedding_scale", "embedding_bits")
+# Chunk metadata value types kept by add_chunks; the second group is stored as strings
+_STRINGIFIED_METADATA_TYPES = (ObjectId, UUID, bytes)
+_STORABLE_METADATA_TYPES = (str, int, float, bool) + _STRINGIFIED_METADATA_TYPES
+
+
+def _quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization: returns (int8 rows, float32 scale per row)."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (zero rows stay zero), so inner product equals cosine."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.clip(norms, 1e-12, None)).astype(np.float32, copy=False)
+
+
+def _binarize(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits of each row packed 8 per byte (dim=1536 -> 192 bytes, 32x smaller than float32)."""
+    return np.packbits(vectors > 0, axis=-1)
+
+
+# Set bits per byte value, for Hamming distances over packed rows
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
 
 class VectorDBService:
     """
@@ -19,24 +62,35 @@ class VectorDBService:
     """
     
     _client_instance = None
+    _collection_cache: Dict[str, Any] = {}  # project_id -> collection handle
+    _query_cache: Optional[QueryCache] = None  # search results, shared by all instances
+    _index_versions: Dict[str, int] = {}  # project_id -> bumped whenever its chunks change
+    # (project_id, storage kind) -> (row count, decoded compact rows); bounded, and expires so other
+    # processes' writes are picked up
+    _shadow_index_cache: Optional[QueryCache] = None
+    # project_id -> (expires_at, {file_id: chunks}); kept current on local add/delete, rescanned on expiry
+    # so writes made by other worker processes show up eventually
+    _file_chunk_counts: Dict[str, Tuple[float, Dict[str, int]]] = {}
     
     def __init__(self):
         """Initialize ChromaDB client with persistent storage."""
         self.settings = get_settings()
-        self.chromadb_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            self.settings.CHROMADB_PATH.lstrip("src/")
-        )
         
-        # Ensure directory exists
-        os.makedirs(self.chromadb_path, exist_ok=True)
-        
-        # Initialize ChromaDB client (singleton pattern)
+        # Initialize ChromaDB client (singleton pattern); path resolution and the directory
+        # check only run for the first instance, later per-request instances reuse the client
         if VectorDBService._client_instance is None:
+            chromadb_path = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                self.settings.CHROMADB_PATH.removeprefix("src/")
+            )
+            
+            # Ensure directory exists
+            os.makedirs(chromadb_path, exist_ok=True)
+            
             try:
-                logger.info(f"Initializing ChromaDB client at: {self.chromadb_path}")
+                logger.info("Initializing ChromaDB client at: %s", chromadb_path)
                 VectorDBService._client_instance = chromadb.PersistentClient(
-                    path=self.chromadb_path,
+                    path=chromadb_path,
                     settings=ChromaSettings(
                         anonymized_telemetry=False,
                         allow_reset=True
@@ -44,11 +98,27 @@ class VectorDBService:
                 )
                 logger.info("ChromaDB client initialized successfully")
             except Exception as e:
-                logger.error(f"Error initializing ChromaDB client: {e}", exc_info=True)
+                logger.error("Error initializing ChromaDB client: %s", e, exc_info=True)
                 raise RuntimeError(f"Failed to initialize ChromaDB client: {e}")
         
         self.client = VectorDBService._client_instance
         self.collection_prefix = self.settings.CHROMADB_COLLECTION_PREFIX
+        self.embedding_dimension = self.settings.EMBEDDING_DIMENSION
+        self.storage_dtype = self.settings.EMBEDDING_STORAGE_DTYPE.lower()
+        
+        if VectorDBService._query_cache is None:
+            VectorDBService._query_cache = QueryCache(
+                max_size=self.settings.VECTOR_QUERY_CACHE_SIZE,
+                ttl_seconds=self.settings.VECTOR_QUERY_CACHE_TTL
+            )
+        self.query_cache = VectorDBService._query_cache
+        
+        if VectorDBService._shadow_index_cache is None:
+            VectorDBService._shadow_index_cache = QueryCache(
+                max_size=self.settings.VECTOR_SHADOW_INDEX_CACHE_SIZE,
+                ttl_seconds=self.settings.VECTOR_SHADOW_INDEX_TTL
+            )
+        self.shadow_index_cache = VectorDBService._shadow_index_cache
     
     def get_or_create_collection(self, project_id: str):
         """
@@ -63,32 +133,81 @@ class VectorDBService:
         Raises:
             RuntimeError: If collection creation fails
         """
+        collection = VectorDBService._collection_cache.get(project_id)
+        if collection is not None:
+            return collection
+        
         collection_name = f"{self.collection_prefix}{project_id}"
         
         try:
             # Try to get existing collection
             try:
                 collection = self.client.get_collection(name=collection_name)
-                logger.debug(f"Retrieved existing collection: {collection_name}")
+                logger.debug("Retrieved existing collection: %s", collection_name)
+                VectorDBService._collection_cache[project_id] = collection
                 return collection
             except Exception:
                 # Collection doesn't exist, create it
-                logger.info(f"Creating new ChromaDB collection: {collection_name}")
+                logger.info("Creating new ChromaDB collection: %s", collection_name)
+                # Stored and query vectors are unit-normalized, so inner product ranks like cosine with a
+                # cheaper distance kernel, and 1 - ip is still the cosine distance search callers expect;
+                # HNSW parameters are fixed at creation (search_ef can be changed later)
                 collection = self.client.create_collection(
                     name=collection_name,
-                    metadata={"project_id": project_id}
+                    metadata={
+                        "project_id": project_id,
+                        "hnsw:space": "ip",
+                        "hnsw:M": self.settings.HNSW_M,
+                        "hnsw:construction_ef": self.settings.HNSW_EF_CONSTRUCTION,
+                        "hnsw:search_ef": self.settings.HNSW_EF_SEARCH
+                    }
                 )
-                logger.info(f"Collection {collection_name} created successfully")
+                logger.info("Collection %s created successfully", collection_name)
+                VectorDBService._collection_cache[project_id] = collection
                 return collection
         except Exception as e:
-            logger.error(f"Error getting/creating collection {collection_name}: {e}", exc_info=True)
+            logger.error("Error getting/creating collection %s: %s", collection_name, e, exc_info=True)
             raise RuntimeError(f"Failed to get/create collection: {e}")
     
+    def invalidate_collection(self, project_id: str):
+        """Forget the cached handle of a project collection (call after dropping or recreating it)."""
+        VectorDBService._collection_cache.pop(project_id, None)
+        VectorDBService._file_chunk_counts.pop(project_id, None)
+    
+    def bulk_get_collections(self, project_ids: List[str]) -> Dict[str, Any]:
+        """
+        Resolve collections for many projects at once (reindex, migration).
+        Uncached lookups run on a thread pool so their SQLite/disk I/O overlaps,
+        and the resolved handles are added to the collection cache.
+        
+        Args:
+            project_ids: Project identifiers (duplicates are resolved once)
+            
+        Returns:
+            Dict: project_id -> ChromaDB collection
+            
+        Raises:
+            RuntimeError: If any collection lookup/creation fails
+        """
+        unique_ids = list(dict.fromkeys(project_ids))
+        collections = {
+            project_id: VectorDBService._collection_cache[project_id]
+            for project_id in unique_ids
+            if project_id in VectorDBService._collection_cache
+        }
+        missing = [project_id for project_id in unique_ids if project_id not in collections]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.settings.VECTORDB_IO_THREADS, len(missing))) as pool:
+                resolved = dict(zip(missing, pool.map(self.get_or_create_collection, missing)))
+            VectorDBService._collection_cache.update(resolved)
+            collections.update(resolved)
+        return collections
+    
     def add_chunks(
         self,
         project_id: str,
         chunks: List,
-        embeddings: List[List[float]],
+        embeddings: np.ndarray,
         file_id: str
     ) -> int:
         """
@@ -97,7 +216,7 @@ class VectorDBService:
         Args:
             project_id: Project identifier
             chunks: List of LangChain Document objects
-            embeddings: List of embedding vectors (one per chunk)
+            embeddings: Array of embedding vectors (one row per chunk)
             file_id: File identifier
             
         Returns:
@@ -111,95 +230,154 @@ class VectorDBService:
             logger.warning("No chunks provided to add_chunks")
             return 0
         
-        if not embeddings or len(embeddings) == 0:
+        if embeddings is None or len(embeddings) == 0:
             logger.warning("No embeddings provided to add_chunks")
             return 0
         
-        if len(chunks) != len(embeddings):
+        # One shape check replaces per-row length checks; all rows come from the same model
+        embedding_vectors = np.asarray(embeddings, dtype=np.float32)
+        if embedding_vectors.ndim != 2 or embedding_vectors.shape[1] != self.embedding_dimension:
             logger.warning(
-                f"Chunk count ({len(chunks)}) doesn't match embedding count ({len(embeddings)})"
+                "Embedding shape mismatch: expected (n, %d), got %s",
+                self.embedding_dimension, embedding_vectors.shape
+            )
+            return 0
+        embedding_vectors = _normalize_rows(embedding_vectors)
+        
+        if len(chunks) != len(embedding_vectors):
+            logger.warning(
+                "Chunk count (%d) doesn't match embedding count (%d)", len(chunks), len(embedding_vectors)
             )
             # Use minimum length to avoid index errors
-            min_length = min(len(chunks), len(embeddings))
+            min_length = min(len(chunks), len(embedding_vectors))
             chunks = chunks[:min_length]
-            embeddings = embeddings[:min_length]
+            embedding_vectors = embedding_vectors[:min_length]
         
         try:
             collection = self.get_or_create_collection(project_id)
             
-            # Prepare data for ChromaDB
-            ids = []
-            documents = []
-            metadatas = []
-            embedding_vectors = []
-            
-            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=1):
-                # Validate embedding dimensions
-                if len(embedding) != self.settings.EMBEDDING_DIMENSION:
-                    logger.warning(
-                        f"Embedding dimension mismatch at chunk {idx}: "
-                        f"expected {self.settings.EMBEDDING_DIMENSION}, got {len(embedding)}"
-                    )
-                    continue
-                
-                # Generate unique ID for this chunk
-                chunk_id = f"chunk_{file_id}_{idx}"
-                ids.append(chunk_id)
-                
-                # Store chunk text as document
-                documents.append(chunk.page_content)
-                
+            # Content-addressed IDs make re-ingesting a file idempotent; repeated text within
+            # the file keeps its first occurrence (Chroma rejects duplicate IDs in one call)
+            first_positions = {}
+            for position, chunk in enumerate(chunks):
+                chunk_id = f"chunk_{file_id}_{hashlib.blake2b(chunk.page_content.encode('utf-8'), digest_size=12).hexdigest()}"
+                first_positions.setdefault(chunk_id, position)
+            ids = list(first_positions)
+            positions = list(first_positions.values())
+            if len(positions) < len(chunks):
+                logger.debug("Skipping %d duplicate chunks of file %s", len(chunks) - len(positions), file_id)
+                embedding_vectors = embedding_vectors[positions]
+            documents = [chunks[position].page_content for position in positions]
+            metadatas = [None] * len(positions)
+            
+            if self.storage_dtype == "f16":
+                half_vectors = embedding_vectors.astype(np.float16)
+            elif self.storage_dtype == "i8":
+                quantized, scales = _quantize_int8(embedding_vectors)
+            elif self.storage_dtype == "binary":
+                packed_bits = _binarize(embedding_vectors)
+            
+            for row, position in enumerate(positions):
+                chunk = chunks[position]
                 # Prepare metadata
                 metadata = {
-                    "chunk_order": idx,
+                    "chunk_order": position + 1,
                     "file_id": file_id,
                     "project_id": project_id,
                 }
                 
                 # Add chunk metadata if available
                 if hasattr(chunk, 'metadata') and chunk.metadata:
-                    # Convert ObjectId to string if present
-                    chunk_metadata = {}
-                    for key, value in chunk.metadata.items():
-                        if hasattr(value, '__str__'):
-                            chunk_metadata[key] = str(value)
-                        else:
-                            chunk_metadata[key] = value
+                    # Keep ChromaDB's native scalar types (filterable numerically); stringify IDs,
+                    # drop values it cannot store
+                    chunk_metadata = {
+                        key: (str(value) if isinstance(value, _STRINGIFIED_METADATA_TYPES) else value)
+                        for key, value in chunk.metadata.items()
+                        if isinstance(value, _STORABLE_METADATA_TYPES)
+                    }
                     metadata.update(chunk_metadata)
                 
-                metadatas.append(metadata)
-                embedding_vectors.append(embedding)
+                if self.storage_dtype == "f16":
+                    # float16 copy for search_similar_f16's first-stage scan
+                    metadata["embedding_f16"] = base64.b64encode(half_vectors[row].tobytes()).decode("ascii")
+                elif self.storage_dtype == "i8":
+                    # int8 copy for search_similar_quantized's first-stage scan (4x smaller than float32)
+                    metadata["embedding_i8"] = base64.b64encode(quantized[row].tobytes()).decode("ascii")
+                    metadata["embedding_scale"] = float(scales[row])
+                elif self.storage_dtype == "binary":
+                    # Sign bits for search_similar_binary's Hamming scan
+                    metadata["embedding_bits"] = base64.b64encode(packed_bits[row].tobytes()).decode("ascii")
+                
+                metadatas[row] = metadata
             
-            if not ids:
-                logger.warning("No valid chunks to add after validation")
-                return 0
+            # Upsert to ChromaDB in mini-batches; the float32 matrix is passed as-is (Chroma stores ndarrays natively)
+            batch_size = min(self.settings.CHROMADB_ADD_BATCH_SIZE, self.client.get_max_batch_size())
             
-            # Add to ChromaDB
-            collection.add(
-                ids=ids,
-                embeddings=embedding_vectors,
-                documents=documents,
-                metadatas=metadatas
-            )
+            # Re-processing with different chunking yields new ids; drop the file's chunks that
+            # the new version no longer produces so retrieval doesn't return stale text.
+            # A fresh per-file counter of 0 means the file has nothing stored, so the scan is skipped
+            cached_stats = VectorDBService._file_chunk_counts.get(project_id)
+            if (
+                cached_stats is not None
+                and cached_stats[0] > time.monotonic()
+                and not cached_stats[1].get(file_id)
+            ):
+                existing_ids = []
+            else:
+                existing_ids = collection.get(where={"file_id": file_id}, include=[])["ids"]
+            stale_ids = list(set(existing_ids).difference(ids))
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+                logger.info("Removed %d stale chunks of file %s", len(stale_ids), file_id)
+            
+            added = 0
+            stored_ids = set(existing_ids).intersection(ids)
+            last_error = None
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                try:
+                    collection.upsert(
+                        ids=ids[start:end],
+                        embeddings=embedding_vectors[start:end],
+                        documents=documents[start:end],
+                        metadatas=metadatas[start:end]
+                    )
+                    added += len(ids[start:end])
+                    stored_ids.update(ids[start:end])
+                except Exception as e:
+                    # Keep going so one bad slice doesn't lose the rest of the file
+                    logger.error("Error adding chunks %d-%d to ChromaDB: %s", start, min(end, len(ids)) - 1, e)
+                    last_error = e
+            
+            if added == 0 and last_error is not None:
+                raise last_error
+            
+            # The file's chunks are exactly the ids kept or written here; unlike a collection.count()
+            # delta this is unaffected by concurrent writes to other files of the project
+            cached_stats = VectorDBService._file_chunk_counts.get(project_id)
+            if cached_stats is not None:
+                cached_stats[1][file_id] = len(stored_ids)
             
             logger.info(
-                f"Added {len(ids)} chunks to ChromaDB collection for project {project_id}"
+                "Added %d of %d chunks to ChromaDB collection for project %s", added, len(ids), project_id
             )
-            return len(ids)
+            # New context can change answers
+            self._mark_project_changed(project_id)
+            return added
             
         except Exception as e:
-            logger.error(f"Error adding chunks to ChromaDB: {e}", exc_info=True)
+            logger.error("Error adding chunks to ChromaDB: %s", e, exc_info=True)
             raise RuntimeError(f"Failed to add chunks to ChromaDB: {e}")
     
-    def search_similar(
+    def search_similar_columns(
         self,
         project_id: str,
         query_embedding: List[float],
         top_k: int = 5,
         file_id: Optional[str] = None
-    ) -> List[Dict[str, Any]]:
+    ) -> Dict[str, List]:
         """
-        Search for similar chunks based on query embedding.
+        Search for similar chunks and return Chroma's columnar result for the query.
         
         Args:
             project_id: Project identifier
@@ -208,20 +386,27 @@ class VectorDBService:
             file_id: Optional file filter
             
         Returns:
-            List[Dict]: List of similar chunks with metadata and distances
+            Dict: Parallel lists "ids", "documents", "metadatas" and "distances"
             
         Raises:
             ValueError: If query embedding is invalid
             RuntimeError: If search fails
         """
-        if not query_embedding:
+        if query_embedding is None or len(query_embedding) == 0:
             raise ValueError("Query embedding cannot be empty")
         
-        if len(query_embedding) != self.settings.EMBEDDING_DIMENSION:
+        if len(query_embedding) != self.embedding_dimension:
             raise ValueError(
                 f"Query embedding dimension mismatch: "
-                f"expected {self.settings.EMBEDDING_DIMENSION}, got {len(query_embedding)}"
+                f"expected {self.embedding_dimension}, got {len(query_embedding)}"
             )
+        query_embedding = _normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+        
+        # Retries/regenerations of the same query skip the index scan until the project changes
+        cache_key = self._query_cache_key(project_id, query_embedding, top_k, file_id)
+        cached = self.query_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
             collection = self.get_or_create_collection(project_id)
@@ -238,25 +423,429 @@ class VectorDBService:
                 where=where_clause
             )
             
-            # Format results
-            formatted_results = []
-            if results['ids'] and len(results['ids'][0]) > 0:
-                for i in range(len(results['ids'][0])):
-                    result = {
-                        "chunk_id": results['ids'][0][i],
-                        "chunk_text": results['documents'][0][i] if results['documents'] else "",
-                        "distance": results['distances'][0][i] if results['distances'] else None,
-                        "metadata": results['metadatas'][0][i] if results['metadatas'] else {}
-                    }
-                    formatted_results.append(result)
+            columns = self._unwrap_query_result(results, 0)
             
-            logger.info(
-                f"Found {len(formatted_results)} similar chunks for project {project_id}"
+            logger.info("Found %d similar chunks for project %s", len(columns["ids"]), project_id)
+            self.query_cache.set(cache_key, columns)
+            return columns
+            
+        except Exception as e:
+            logger.error("Error searching ChromaDB: %s", e, exc_info=True)
+            raise RuntimeError(f"Failed to search ChromaDB: {e}")
+    
+    @staticmethod
+    def _query_cache_key(
+        project_id: str,
+        query_embedding: List[float],
+        top_k: int,
+        file_id: Optional[str]
+    ) -> Tuple:
+        digest = hashlib.blake2b(np.asarray(query_embedding, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+        return (project_id, digest, top_k, file_id)
+    
+    def _unwrap_query_result(self, results: Dict[str, Any], q_idx: int) -> Dict[str, List]:
+        """Columns of one query from a (possibly batched) collection.query result; missing columns become placeholders."""
+        ids = results["ids"][q_idx] if results["ids"] else []
+        metadatas = results["metadatas"][q_idx] if results["metadatas"] else [{}] * len(ids)
+        # The compact copies are internal to the two-stage searches; chunks indexed under an
+        # earlier EMBEDDING_STORAGE_DTYPE keep them, so strip regardless of the current setting
+        metadatas = [
+            {key: value for key, value in metadata.items() if key not in _SHADOW_METADATA_KEYS}
+            for metadata in metadatas
+        ]
+        return {
+            "ids": ids,
+            "documents": results["documents"][q_idx] if results["documents"] else [""] * len(ids),
+            "metadatas": metadatas,
+            "distances": results["distances"][q_idx] if results["distances"] else [None] * len(ids),
+        }
+    
+    def search_similar_many(
+        self,
+        project_id: str,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        file_id: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several query embeddings with a single collection.query call.
+        
+        Queries already in the result cache are answered from it; only the
+        remaining ones are sent to ChromaDB.
+        
+        Args:
+            project_id: Project identifier
+            query_embeddings: Query embedding vectors
+            top_k: Number of results to return per query
+            file_id: Optional file filter
+            
+        Returns:
+            List[List[Dict]]: One list of similar chunks per query, in input order
+            
+        Raises:
+            ValueError: If query embeddings are invalid
+            RuntimeError: If search fails
+        """
+        if query_embeddings is None or len(query_embeddings) == 0:
+            return []
+        
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self.embedding_dimension:
+            raise ValueError(
+                f"Query embeddings shape mismatch: "
+                f"expected (n, {self.embedding_dimension}), got {queries.shape}"
+            )
+        queries = _normalize_rows(queries)
+        
+        keys = [self._query_cache_key(project_id, query, top_k, file_id) for query in queries]
+        all_columns = [self.query_cache.get(key) for key in keys]
+        missing = [i for i, columns in enumerate(all_columns) if columns is None]
+        
+        if missing:
+            try:
+                collection = self.get_or_create_collection(project_id)
+                results = collection.query(
+                    query_embeddings=queries[missing].tolist(),
+                    n_results=top_k,
+                    where={"file_id": file_id} if file_id else None
+                )
+            except Exception as e:
+                logger.error("Error searching ChromaDB: %s", e, exc_info=True)
+                raise RuntimeError(f"Failed to search ChromaDB: {e}")
+            
+            for q_idx, i in enumerate(missing):
+                all_columns[i] = self._unwrap_query_result(results, q_idx)
+                self.query_cache.set(keys[i], all_columns[i])
+        
+        logger.info(
+            "Searched %d queries for project %s (%d from cache)",
+            len(queries), project_id, len(queries) - len(missing)
+        )
+        return [
+            [
+                {"chunk_id": chunk_id, "chunk_text": document, "distance": distance, "metadata": metadata}
+                for chunk_id, document, metadata, distance in zip(
+                    columns["ids"], columns["documents"], columns["metadatas"], columns["distances"]
+                )
+            ]
+            for columns in all_columns
+        ]
+    
+    def search_similar(
+        self,
+        project_id: str,
+        query_embedding: List[float],
+        top_k: int = 5,
+        file_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for similar chunks based on query embedding.
+        
+        Args:
+            project_id: Project identifier
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            file_id: Optional file filter
+            
+        Returns:
+            List[Dict]: List of similar chunks with metadata and distances
+            
+        Raises:
+            ValueError: If query embedding is invalid
+            RuntimeError: If search fails
+        """
+        columns = self.search_similar_columns(project_id, query_embedding, top_k, file_id)
+        return [
+            {"chunk_id": chunk_id, "chunk_text": document, "distance": distance, "metadata": metadata}
+            for chunk_id, document, metadata, distance in zip(
+                columns["ids"], columns["documents"], columns["metadatas"], columns["distances"]
+            )
+        ]
+    
+    def _get_shadow_index(self, project_id: str, kind: str, build) -> Optional[Tuple]:
+        """
+        Decoded compact rows of a project for one storage kind, cached until the project
+        changes in this process, its row count changes, or the entry expires.
+        
+        Args:
+            project_id: Project identifier
+            kind: Metadata key of the compact copy
+            build: Callable decoding the rows from a collection
+            
+        Returns:
+            Tuple: Output of build, or None if some chunks have no compact copy
+            (indexed before the setting was enabled) and the float search must be used
+        """
+        collection = self.get_or_create_collection(project_id)
+        total = collection.count()
+        key = (project_id, kind)
+        cached = self.shadow_index_cache.get(key)
+        if cached is None or cached[0] != total:
+            cached = (total, build(collection))
+            self.shadow_index_cache.set(key, cached)
+        
+        index = cached[1]
+        if len(index[0]) < total:
+            logger.debug(
+                "Only %d of %d chunks of project %s have %s copies, using the float search",
+                len(index[0]), total, project_id, kind
+            )
+            return None
+        return index
+    
+    def _build_quantized_index(self, collection) -> Tuple:
+        """Decode the int8 rows of a collection: (ids, file_ids, int8 rows, scales)."""
+        entries = collection.get(include=["metadatas"])
+        rows = [
+            (entry_id, metadata)
+            for entry_id, metadata in zip(entries["ids"], entries["metadatas"])
+            if metadata and "embedding_i8" in metadata
+        ]
+        ids = [entry_id for entry_id, _ in rows]
+        file_ids = np.array([metadata.get("file_id", "") for _, metadata in rows], dtype=object)
+        quantized = np.frombuffer(
+            b"".join(base64.b64decode(metadata["embedding_i8"]) for _, metadata in rows),
+            dtype=np.int8
+        ).reshape(len(rows), self.embedding_dimension)
+        scales = np.array([metadata["embedding_scale"] for _, metadata in rows], dtype=np.float32)
+        
+        return ids, file_ids, quantized, scales
+    
+    def _rescore_candidates(
+        self,
+        project_id: str,
+        candidate_ids: List[str],
+        query: np.ndarray,
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """Exact cosine rescoring of first-stage candidates against their float32 embeddings."""
+        collection = self.get_or_create_collection(project_id)
+        fetched = collection.get(
+            ids=candidate_ids,
+            include=["embeddings", "documents", "metadatas"]
+        )
+        vectors = np.asarray(fetched["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query)
+        norms[norms == 0] = 1.0
+        distances = 1.0 - (vectors @ query) / norms
+        order = np.argsort(distances)[:top_k]
+        
+        return [
+            {
+                "chunk_id": fetched["ids"][i],
+                "chunk_text": fetched["documents"][i],
+                "distance": float(distances[i]),
+                "metadata": {
+                    key: value for key, value in fetched["metadatas"][i].items()
+                    if key not in _SHADOW_METADATA_KEYS
+                }
+            }
+            for i in order
+        ]
+    
+    def search_similar_quantized(
+        self,
+        project_id: str,
+        query_embedding: List[float],
+        top_k: int = 5,
+        file_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Two-stage search over the int8 copies written with EMBEDDING_STORAGE_DTYPE=i8:
+        an int8 dot-product scan picks candidates, which are rescored exactly
+        against their float32 embeddings.
+        
+        Args:
+            project_id: Project identifier
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            file_id: Optional file filter
+            
+        Returns:
+            List[Dict]: Same format as search_similar, with cosine distances; empty when not every
+            chunk has an int8 copy, so callers fall back to search_similar
+            
+        Raises:
+            ValueError: If query embedding is invalid
+            RuntimeError: If search fails
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape != (self.embedding_dimension,):
+            raise ValueError(
+                f"Query embedding dimension mismatch: "
+                f"expected {self.embedding_dimension}, got {query.shape}"
+            )
+        
+        try:
+            index = self._get_shadow_index(project_id, "embedding_i8", self._build_quantized_index)
+            if index is None or not index[0]:
+                return []
+            ids, file_ids, quantized, scales = index
+            
+            # Stage 1: int8 scan (int32 accumulation), scaled back to approximate dot products
+            query_q, query_scale = _quantize_int8(query[None, :])
+            scores = (quantized.astype(np.int32) @ query_q[0].astype(np.int32)) * scales * query_scale[0]
+            if file_id:
+                scores = np.where(file_ids == file_id, scores, -np.inf)
+            
+            n_candidates = min(len(ids), top_k * _QUANTIZED_OVERSAMPLE)
+            candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+            candidates = candidates[np.isfinite(scores[candidates])]
+            if len(candidates) == 0:
+                return []
+            
+            # Stage 2: exact cosine on the float32 vectors of the candidates
+            return self._rescore_candidates(project_id, [ids[i] for i in candidates], query, top_k)
+            
+        except Exception as e:
+            logger.error("Error in quantized search: %s", e, exc_info=True)
+            raise RuntimeError(f"Failed to search ChromaDB: {e}")
+    
+    def _build_binary_index(self, collection) -> Tuple:
+        """Decode the sign-bit rows of a collection: (ids, file_ids, packed bit rows)."""
+        entries = collection.get(include=["metadatas"])
+        rows = [
+            (entry_id, metadata)
+            for entry_id, metadata in zip(entries["ids"], entries["metadatas"])
+            if metadata and "embedding_bits" in metadata
+        ]
+        ids = [entry_id for entry_id, _ in rows]
+        file_ids = np.array([metadata.get("file_id", "") for _, metadata in rows], dtype=object)
+        packed = np.frombuffer(
+            b"".join(base64.b64decode(metadata["embedding_bits"]) for _, metadata in rows),
+            dtype=np.uint8
+        ).reshape(len(rows), (self.embedding_dimension + 7) // 8)
+        
+        return ids, file_ids, packed
+    
+    def search_similar_binary(
+        self,
+        project_id: str,
+        query_embedding: List[float],
+        top_k: int = 5,
+        file_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Two-stage search over the sign bits written with EMBEDDING_STORAGE_DTYPE=binary:
+        a Hamming-distance scan picks candidates, which are rescored exactly
+        against their float32 embeddings.
+        
+        Args:
+            project_id: Project identifier
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            file_id: Optional file filter
+            
+        Returns:
+            List[Dict]: Same format as search_similar, with cosine distances; empty when not every
+            chunk has sign bits, so callers fall back to search_similar
+            
+        Raises:
+            ValueError: If query embedding is invalid
+            RuntimeError: If search fails
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape != (self.embedding_dimension,):
+            raise ValueError(
+                f"Query embedding dimension mismatch: "
+                f"expected {self.embedding_dimension}, got {query.shape}"
+            )
+        
+        try:
+            index = self._get_shadow_index(project_id, "embedding_bits", self._build_binary_index)
+            if index is None or not index[0]:
+                return []
+            ids, file_ids, packed = index
+            
+            # Stage 1: Hamming distance = popcount(row XOR query), one table lookup per byte
+            hamming = _POPCOUNT[np.bitwise_xor(packed, _binarize(query))].sum(axis=1, dtype=np.int32)
+            if file_id:
+                hamming = np.where(file_ids == file_id, hamming, np.iinfo(np.int32).max)
+            
+            n_candidates = min(len(ids), top_k * _QUANTIZED_OVERSAMPLE)
+            candidates = np.argpartition(hamming, n_candidates - 1)[:n_candidates]
+            candidates = candidates[hamming[candidates] != np.iinfo(np.int32).max]
+            if len(candidates) == 0:
+                return []
+            
+            # Stage 2: exact cosine on the float32 vectors of the candidates
+            return self._rescore_candidates(project_id, [ids[i] for i in candidates], query, top_k)
+            
+        except Exception as e:
+            logger.error("Error in binary search: %s", e, exc_info=True)
+            raise RuntimeError(f"Failed to search ChromaDB: {e}")
+    
+    def _build_f16_index(self, collection) -> Tuple:
+        """Decode the float16 rows of a collection: (ids, file_ids, float16 rows)."""
+        entries = collection.get(include=["metadatas"])
+        rows = [
+            (entry_id, metadata)
+            for entry_id, metadata in zip(entries["ids"], entries["metadatas"])
+            if metadata and "embedding_f16" in metadata
+        ]
+        ids = [entry_id for entry_id, _ in rows]
+        file_ids = np.array([metadata.get("file_id", "") for _, metadata in rows], dtype=object)
+        half_vectors = np.frombuffer(
+            b"".join(base64.b64decode(metadata["embedding_f16"]) for _, metadata in rows),
+            dtype=np.float16
+        ).reshape(len(rows), self.embedding_dimension)
+        return ids, file_ids, half_vectors
+    
+    def search_similar_f16(
+        self,
+        project_id: str,
+        query_embedding: List[float],
+        top_k: int = 5,
+        file_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Two-stage search over the float16 copies written with EMBEDDING_STORAGE_DTYPE=f16:
+        a float16 dot-product scan (accumulated in float32) picks candidates, which are
+        rescored exactly against their float32 embeddings.
+        
+        Args:
+            project_id: Project identifier
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            file_id: Optional file filter
+            
+        Returns:
+            List[Dict]: Same format as search_similar, with cosine distances; empty when not every
+            chunk has a float16 copy, so callers fall back to search_similar
+            
+        Raises:
+            ValueError: If query embedding is invalid
+            RuntimeError: If search fails
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape != (self.embedding_dimension,):
+            raise ValueError(
+                f"Query embedding dimension mismatch: "
+                f"expected {self.embedding_dimension}, got {query.shape}"
             )
-            return formatted_results
+        
+        try:
+            index = self._get_shadow_index(project_id, "embedding_f16", self._build_f16_index)
+            if index is None or not index[0]:
+                return []
+            ids, file_ids, half_vectors = index
+            
+            # Stage 1: float16 scan; rows are unit-normalized, so this approximates cosine similarity
+            scores = half_vectors.astype(np.float32) @ _normalize_rows(query)
+            if file_id:
+                scores = np.where(file_ids == file_id, scores, -np.inf)
+            
+            n_candidates = min(len(ids), top_k * _QUANTIZED_OVERSAMPLE)
+            candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+            candidates = candidates[np.isfinite(scores[candidates])]
+            if len(candidates) == 0:
+                return []
+            
+            # Stage 2: exact cosine on the float32 vectors of the candidates
+            return self._rescore_candidates(project_id, [ids[i] for i in candidates], query, top_k)
             
         except Exception as e:
-            logger.error(f"Error searching ChromaDB: {e}", exc_info=True)
+            logger.error("Error in float16 search: %s", e, exc_info=True)
             raise RuntimeError(f"Failed to search ChromaDB: {e}")
     
     def delete_chunks_by_file(self, project_id: str, file_id: str) -> int:
@@ -276,31 +865,35 @@ class VectorDBService:
         try:
             collection = self.get_or_create_collection(project_id)
             
-            # Get all chunks for this file
-            results = collection.get(
-                where={"file_id": file_id}
-            )
-            
-            if not results['ids']:
-                logger.info(f"No chunks found for file {file_id} in project {project_id}")
+            # ChromaDB's delete returns nothing; fetch only the matching ids (no documents or
+            # embeddings) and delete those, so concurrent writes to other files can't skew the count
+            ids = collection.get(where={"file_id": file_id}, include=[])["ids"]
+
+            if not ids:
+                logger.info("No chunks found for file %s in project %s", file_id, project_id)
                 return 0
+
+            collection.delete(ids=ids)
+            deleted_count = len(ids)
+
+            cached_stats = VectorDBService._file_chunk_counts.get(project_id)
+            if cached_stats is not None:
+                cached_stats[1].pop(file_id, None)
             
-            # Delete chunks
-            collection.delete(ids=results['ids'])
-            
-            deleted_count = len(results['ids'])
-            logger.info(
-                f"Deleted {deleted_count} chunks for file {file_id} from project {project_id}"
-            )
+            self._mark_project_changed(project_id)
+            logger.info("Deleted %d chunks for file %s from project %s", deleted_count, file_id, project_id)
             return deleted_count
             
         except Exception as e:
-            logger.error(f"Error deleting chunks from ChromaDB: {e}", exc_info=True)
+            logger.error("Error deleting chunks from ChromaDB: %s", e, exc_info=True)
             raise RuntimeError(f"Failed to delete chunks from ChromaDB: {e}")
     
     def get_collection_stats(self, project_id: str) -> Dict[str, Any]:
         """
         Get statistics about a ChromaDB collection.
+        Served from per-file chunk counters kept current by add_chunks and
+        delete_chunks_by_file; the collection is rescanned every
+        VECTOR_STATS_CACHE_TTL seconds to pick up other processes' writes.
         
         Args:
             project_id: Project identifier
@@ -312,31 +905,157 @@ class VectorDBService:
             RuntimeError: If stats retrieval fails
         """
         try:
-            collection = self.get_or_create_collection(project_id)
-            
-            # Get all documents to calculate stats
-            results = collection.get()
-            
-            count = len(results['ids']) if results['ids'] else 0
-            
-            # Get unique file IDs
-            file_ids = set()
-            if results['metadatas']:
-                for metadata in results['metadatas']:
-                    if metadata and 'file_id' in metadata:
-                        file_ids.add(metadata['file_id'])
+            cached_stats = VectorDBService._file_chunk_counts.get(project_id)
+            if cached_stats is not None and cached_stats[0] > time.monotonic():
+                # Snapshot: add/delete threads may update the live dict meanwhile
+                file_counts = dict(cached_stats[1])
+            else:
+                collection = self.get_or_create_collection(project_id)
+                # Only metadata is needed for per-file counts; skip documents and embeddings
+                results = collection.get(include=["metadatas"])
+                file_counts = dict(Counter(
+                    m['file_id'] for m in results['metadatas'] or [] if m and 'file_id' in m
+                ))
+                VectorDBService._file_chunk_counts[project_id] = (
+                    time.monotonic() + self.settings.VECTOR_STATS_CACHE_TTL,
+                    file_counts
+                )
             
+            file_ids = [file_id for file_id, chunk_count in file_counts.items() if chunk_count > 0]
             stats = {
                 "project_id": project_id,
                 "collection_name": f"{self.collection_prefix}{project_id}",
-                "total_chunks": count,
+                "total_chunks": sum(file_counts.values()),
                 "unique_files": len(file_ids),
-                "file_ids": list(file_ids)
+                "file_ids": file_ids
             }
             
             return stats
             
         except Exception as e:
-            logger.error(f"Error getting collection stats: {e}", exc_info=True)
+            logger.error("Error getting collection stats: %s", e, exc_info=True)
             raise RuntimeError(f"Failed to get collection stats: {e}")
-
+    
+    def _answer_cache_name(self, project_id: str) -> str:
+        return f"rag_answer_cache_{project_id}"
+    
+    def get_cached_answer(
+        self,
+        project_id: str,
+        query_embedding: List[float],
+        file_id: Optional[str],
+        top_k: int,
+        min_similarity: float,
+        ttl_seconds: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up a previously generated answer for a semantically equivalent query.
+        
+        Args:
+            project_id: Project identifier
+            query_embedding: Embedding of the new query
+            file_id: File filter the answer was generated with
+            top_k: Number of context chunks the answer was generated with
+            min_similarity: Cosine similarity a cached query must reach
+            ttl_seconds: Maximum age of a cached answer
+            
+        Returns:
+            Dict: Cached answer payload, or None on a miss
+        """
+        try:
+            collection = self.client.get_collection(name=self._answer_cache_name(project_id))
+        except Exception:
+            return None
+        
+        try:
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=1,
+                where={"$and": [{"file_id": file_id or ""}, {"top_k": top_k}]},
+                include=["metadatas", "distances"]
+            )
+            if not results["ids"] or not results["ids"][0]:
+                return None
+            
+            entry_id = results["ids"][0][0]
+            metadata = results["metadatas"][0][0]
+            similarity = 1.0 - results["distances"][0][0]
+            now = time.time()
+            if similarity < min_similarity or now - metadata["created_at"] > ttl_seconds:
+                return None
+            
+            # Refresh the LRU timestamp at most once per interval, so hot hits stay read-only
+            if now - metadata.get("last_used", 0) > _ANSWER_LRU_REFRESH_SECONDS:
+                collection.update(ids=[entry_id], metadatas=[{**metadata, "last_used": now}])
+            return orjson.loads(metadata["payload"])
+        except Exception as e:
+            logger.warning("Answer cache lookup failed for project %s: %s", project_id, e)
+            return None
+    
+    def cache_answer(
+        self,
+        project_id: str,
+        query_embedding: List[float],
+        file_id: Optional[str],
+        top_k: int,
+        payload: Dict[str, Any],
+        max_entries: int
+    ):
+        """
+        Store a generated answer, evicting the least recently used entries beyond max_entries.
+        
+        Args:
+            project_id: Project identifier
+            query_embedding: Embedding of the query that produced the answer
+            file_id: File filter used for the answer
+            top_k: Number of context chunks used for the answer
+            payload: JSON-serialisable answer payload
+            max_entries: Cache capacity for the project
+        """
+        try:
+            collection = self.client.get_or_create_collection(
+                name=self._answer_cache_name(project_id),
+                metadata={"project_id": project_id, "hnsw:space": "cosine"}
+            )
+            now = time.time()
+            collection.add(
+                ids=[f"answer_{time.time_ns()}"],
+                embeddings=[query_embedding],
+                metadatas=[{
+                    "file_id": file_id or "",
+                    "top_k": top_k,
+                    "created_at": now,
+                    "last_used": now,
+                    "payload": orjson.dumps(payload).decode("utf-8")
+                }]
+            )
+            
+            overflow = collection.count() - max_entries
+            if overflow > 0:
+                entries = collection.get(include=["metadatas"])
+                by_age = sorted(zip(entries["ids"], entries["metadatas"]), key=lambda item: item[1]["last_used"])
+                collection.delete(ids=[entry_id for entry_id, _ in by_age[:overflow]])
+        except Exception as e:
+            logger.warning("Could not cache answer for project %s: %s", project_id, e)
+    
+    def get_index_version(self, project_id: str) -> int:
+        """Counter that changes whenever chunks are added to or deleted from the project in this process."""
+        return VectorDBService._index_versions.get(project_id, 0)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Counters of the search result cache."""
+        return self.query_cache.get_stats()
+    
+    def _mark_project_changed(self, project_id: str):
+        """Invalidate everything derived from a project's chunks (search results, answers, prompts)."""
+        VectorDBService._index_versions[project_id] = VectorDBService._index_versions.get(project_id, 0) + 1
+        self.query_cache.invalidate_project(project_id)
+        self.shadow_index_cache.invalidate_project(project_id)
+        self.clear_answer_cache(project_id)
+    
+    def clear_answer_cache(self, project_id: str):
+        """Drop cached answers for a project (its documents changed)."""
+        try:
+            self.client.delete_collection(name=self._answer_cache_name(project_id))
+        except Exception:
+            pass  # Nothing cached yet
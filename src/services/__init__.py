@@ -1,8 +1,10 @@
 # Services module
+from .QueryEmbeddingCache import QueryEmbeddingCache
+from .QueryCache import QueryCache
 from .EmbeddingService import EmbeddingService
 from .VectorDBService import VectorDBService
 from .LLMService import LLMService
 from .RAGService import RAGService
 
-__all__ = ['EmbeddingService', 'VectorDBService', 'LLMService', 'RAGService']
+__all__ = ['QueryEmbeddingCache', 'QueryCache', 'EmbeddingService', 'VectorDBService', 'LLMService', 'RAGService']
 